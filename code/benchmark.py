@@ -0,0 +1,605 @@
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+from contextlib import contextmanager
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from datastorage import Base, Comment, content_hash, save_to_database
+
+STUB_LABELS = ("negative", "neutral", "positive")
+
+
+def _orm_save_to_database(data, session):
+    """Original row-by-row ORM write path, kept as the benchmark reference.
+
+    It hashes and deduplicates the page like the bulk path does, so the
+    comparison only measures how the rows are written.
+    """
+    data = data.assign(content_hash=content_hash(data)).drop_duplicates(
+        subset=["content_hash"]
+    )
+    for _, row in data.iterrows():
+        session.add(
+            Comment(
+                stock=row["stock"],
+                comment_time=row["comment_time"],
+                comments=row["comments"],
+                sentiment_tag=row["sentiment_tag"],
+                influence=int(row["influence"]),
+                content_hash=row["content_hash"],
+            )
+        )
+    session.commit()
+
+
+def make_comments(n_rows, n_stocks=30, seed=0):
+    """Generates a synthetic comments DataFrame shaped like the scraper output."""
+    rng = np.random.default_rng(seed)
+    stocks = np.array([f"T{i:04d}" for i in range(n_stocks)])
+    times = pd.Timestamp("2024-01-01") + pd.to_timedelta(
+        rng.integers(0, 365 * 24 * 3600, n_rows), unit="s"
+    )
+    tags = np.array(["Bullish", "Bearish", None], dtype=object)
+    return pd.DataFrame(
+        {
+            "stock": stocks[rng.integers(0, n_stocks, n_rows)],
+            "comment_time": times.to_pydatetime(),
+            "comments": [f"synthetic comment {i} about the market" for i in range(n_rows)],
+            "sentiment_tag": tags[rng.integers(0, 3, n_rows)],
+            "influence": rng.integers(0, 50, n_rows),
+        }
+    )
+
+
+def make_sentiments(n_rows, n_stocks=30, n_days=90, seed=0, missing_influence=0.01):
+    """Generates a synthetic scored-comments table (stock, comment_time, influence, sentiment)."""
+    rng = np.random.default_rng(seed)
+    stocks = np.array([f"T{i:04d}" for i in range(n_stocks)])
+    influence = rng.geometric(0.2, n_rows).astype("float64") - 1
+    influence[rng.random(n_rows) < missing_influence] = np.nan
+    return pd.DataFrame(
+        {
+            "stock": stocks[rng.integers(0, n_stocks, n_rows)],
+            "comment_time": pd.Timestamp("2024-08-01")
+            + pd.to_timedelta(rng.integers(0, n_days * 24 * 3600, n_rows), unit="s"),
+            "influence": influence,
+            "sentiment": np.array(["positive", "negative", "neutral"])[
+                rng.integers(0, 3, n_rows)
+            ],
+        }
+    )
+
+
+def _reference_sentiment_score(all_sentiments):
+    """Original per-group loop implementation of get_sentiment_score, kept as the reference."""
+    all_sentiments = all_sentiments.copy()
+    all_sentiments["comment_time"] = pd.to_datetime(all_sentiments["comment_time"])
+    all_sentiments["date"] = all_sentiments["comment_time"].dt.date
+    all_sentiments["weighted_influence"] = np.log1p(all_sentiments["influence"]) + 1
+    sentiment_scores = []
+    for (stock, date), group in all_sentiments.groupby(["stock", "date"]):
+        positive_weighted = group.loc[
+            group["sentiment"] == "positive", "weighted_influence"
+        ].sum()
+        negative_weighted = group.loc[
+            group["sentiment"] == "negative", "weighted_influence"
+        ].sum()
+        if (positive_weighted + negative_weighted) > 0:
+            sentiment_score = (positive_weighted - negative_weighted) / (
+                positive_weighted + negative_weighted
+            )
+        else:
+            sentiment_score = 0
+        final_score = sentiment_score * np.log1p(len(group))
+        sentiment_scores.append(
+            {"stock": stock, "date": date, "sentiment_score": final_score}
+        )
+    return pd.DataFrame(sentiment_scores)
+
+
+def benchmark_sentiment_score(
+    n_rows=10_000_000, n_stocks=500, n_days=365, include_reference=True
+):
+    """Times the vectorized daily aggregation against the reference loop."""
+    from sentiment_analysis import compute_sentiment_score
+
+    data = make_sentiments(n_rows, n_stocks, n_days)
+    results = {}
+    start = time.perf_counter()
+    compute_sentiment_score(data)
+    results["vectorized"] = time.perf_counter() - start
+    if include_reference:
+        start = time.perf_counter()
+        _reference_sentiment_score(data)
+        results["loop"] = time.perf_counter() - start
+    for name, elapsed in results.items():
+        print(f"get_sentiment_score[{name}]: {elapsed:.2f}s for {n_rows:,} rows")
+    return results
+
+
+def make_ohlcv(n_tickers, n_days=250, seed=0):
+    """Generates a dict of per-ticker daily OHLCV frames like data/financialdata."""
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range("2024-01-02", periods=n_days)
+    stock_data = {}
+    for i in range(n_tickers):
+        close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, n_days)))
+        spread = np.abs(rng.normal(0, 0.01, n_days)) * close
+        stock_data[f"T{i:04d}"] = pd.DataFrame(
+            {
+                "date": dates,
+                "open": close + rng.normal(0, 0.5, n_days),
+                "high": close + spread,
+                "low": close - spread,
+                "close": close,
+                "volume": rng.integers(1_000_000, 50_000_000, n_days),
+                "return": np.concatenate([[np.nan], np.diff(np.log(close))]) * 100,
+                "size": close * rng.integers(1_000_000, 10_000_000),
+            }
+        )
+    return stock_data
+
+
+def make_daily_sentiment(tickers, dates, coverage=0.8, seed=0):
+    """Generates a daily sentiment score table for a random subset of stock-days."""
+    rng = np.random.default_rng(seed)
+    stock = np.repeat(np.asarray(tickers, dtype=object), len(dates))
+    date = np.tile(np.asarray(dates), len(tickers))
+    keep = rng.random(len(stock)) < coverage
+    scores = rng.normal(0, 1, len(stock))
+    scores[rng.random(len(stock)) < 0.05] = 0.0
+    return pd.DataFrame(
+        {"stock": stock[keep], "date": date[keep], "sentiment_score": scores[keep]}
+    )
+
+
+def _reference_process_all_sheets(stock_data, sentiment_data):
+    """Original per-ticker merge loop of process_all_sheets, kept as the reference."""
+    from data_clean import merge_data
+
+    combined_data = [
+        merge_data(stock_df.copy(), sentiment_data, company)
+        for company, stock_df in stock_data.items()
+    ]
+    return (
+        pd.concat(combined_data, ignore_index=True) if combined_data else pd.DataFrame()
+    )
+
+
+def benchmark_process_all_sheets(ticker_counts=(30, 300, 3000), n_days=250):
+    """Times the single-pass merge against the per-ticker loop and checks identical output."""
+    from data_clean import process_all_sheets
+
+    results = {}
+    for n_tickers in ticker_counts:
+        stock_data = make_ohlcv(n_tickers, n_days)
+        dates = next(iter(stock_data.values()))["date"]
+        sentiment = make_daily_sentiment(list(stock_data), dates)
+        start = time.perf_counter()
+        expected = _reference_process_all_sheets(stock_data, sentiment.copy())
+        loop = time.perf_counter() - start
+        start = time.perf_counter()
+        actual = process_all_sheets(stock_data, sentiment)
+        single_pass = time.perf_counter() - start
+        pd.testing.assert_frame_equal(actual, expected)
+        results[n_tickers] = {"loop": loop, "single_pass": single_pass}
+        print(
+            f"process_all_sheets[{n_tickers} tickers]: loop {loop:.3f}s, "
+            f"single pass {single_pass:.3f}s ({loop / single_pass:.1f}x)"
+        )
+    return results
+
+
+def make_comment_texts(n_comments, seed=0):
+    """Generates comment texts with a long-tailed length distribution like StockTwits posts."""
+    rng = np.random.default_rng(seed)
+    words = np.array(
+        "buy sell hold calls puts earnings beat miss guidance moon dump rally "
+        "support resistance breakout short squeeze dividend upgrade downgrade".split()
+    )
+    lengths = np.minimum(rng.lognormal(mean=2.3, sigma=0.9, size=n_comments), 400)
+    return [
+        " ".join(words[rng.integers(0, len(words), max(int(length), 1))])
+        for length in lengths
+    ]
+
+
+@contextmanager
+def make_session(database_url=None):
+    """Yields a session on a fresh SQLite file (or the given URL) with all tables created.
+
+    SQLite runs in WAL mode so chunked reads can stream while results are
+    written. On exit the session is closed, the engine disposed and the
+    temporary SQLite file deleted.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        if database_url is None:
+            database_url = f"sqlite:///{os.path.join(directory, 'benchmark.db')}"
+        engine = create_engine(database_url)
+        if engine.dialect.name == "sqlite":
+
+            @event.listens_for(engine, "connect")
+            def _enable_wal(connection, _):
+                connection.execute("PRAGMA journal_mode=WAL")
+                connection.execute("PRAGMA synchronous=NORMAL")
+
+        Base.metadata.drop_all(engine)
+        Base.metadata.create_all(engine)
+        session = sessionmaker(bind=engine)()
+        try:
+            yield session
+        finally:
+            session.close()
+            engine.dispose()
+
+
+def benchmark_save_to_database(n_rows=50000, page_size=50, database_url=None):
+    """Compares rows/sec of the ORM write path with the bulk ingest path."""
+    data = make_comments(n_rows)
+    results = {}
+    for name, save in [("orm", _orm_save_to_database), ("bulk", save_to_database)]:
+        with make_session(database_url) as session:
+            start = time.perf_counter()
+            for offset in range(0, n_rows, page_size):
+                save(data.iloc[offset : offset + page_size], session)
+            elapsed = time.perf_counter() - start
+        results[name] = n_rows / elapsed
+    for name, rate in results.items():
+        print(f"save_to_database[{name}]: {rate:,.0f} rows/sec")
+    print(f"speedup: {results['bulk'] / results['orm']:.2f}x")
+    return results
+
+
+def benchmark_batching(n_comments=2000, batch_size=16, max_tokens=4096):
+    """Compares comments/sec on CPU for fixed-size batches and token-budget batches."""
+    from transformers import pipeline
+    from inference import classify_comments
+    from sentiment_analysis import MODEL_NAME
+
+    pipe = pipeline(
+        "text-classification",
+        model=MODEL_NAME,
+        tokenizer=MODEL_NAME,
+        device=-1,
+        truncation=True,
+        padding=True,
+    )
+    comments = make_comment_texts(n_comments)
+    results = {}
+    for name, budget, size in [
+        ("fixed", None, batch_size),
+        ("token_budget", max_tokens, 64),
+    ]:
+        start = time.perf_counter()
+        classify_comments(pipe, comments, batch_size=size, max_tokens=budget)
+        results[name] = n_comments / (time.perf_counter() - start)
+    for name, rate in results.items():
+        print(f"classify_comments[{name}]: {rate:,.1f} comments/sec")
+    print(f"speedup: {results['token_budget'] / results['fixed']:.2f}x")
+    return results
+
+
+def benchmark_extraction(n_messages=200, repeats=5):
+    """Compares pages/sec of the JavaScript and per-element WebDriver extraction paths.
+
+    Runs headless Chrome against the local fixture page, with and without a
+    leading message body, and checks both paths return the same rows.
+    """
+    from fixture_server import serve_fixtures
+    from stocktwit import get_comments_one_page, make_driver
+
+    server, base_url = serve_fixtures()
+    driver = make_driver()
+    results = {}
+    try:
+        for leading_body in (0, 1):
+            driver.get(
+                f"{base_url}BENCH?page_size={n_messages}"
+                f"&max_messages={n_messages}&leading_body={leading_body}"
+            )
+            pages = {}
+            for mode in ("webdriver", "js"):
+                start = time.perf_counter()
+                for _ in range(repeats):
+                    pages[mode] = get_comments_one_page(driver, mode=mode)
+                results[(mode, leading_body)] = repeats / (time.perf_counter() - start)
+            if pages["js"] != pages["webdriver"]:
+                raise AssertionError(
+                    f"Extraction modes disagree (leading_body={leading_body})"
+                )
+    finally:
+        driver.quit()
+        server.shutdown()
+    for (mode, leading_body), rate in results.items():
+        print(
+            f"get_comments_one_page[{mode}, leading_body={leading_body}]: "
+            f"{rate:,.2f} pages/sec ({n_messages} messages)"
+        )
+    for leading_body in (0, 1):
+        speedup = results[("js", leading_body)] / results[("webdriver", leading_body)]
+        print(f"speedup (leading_body={leading_body}): {speedup:.2f}x")
+    return results
+
+
+def make_corpus(n_tickers, n_days, comments_per_day, seed=0):
+    """Generates a comment corpus of n_tickers x n_days business days x comments_per_day.
+
+    Tickers and dates line up with make_ohlcv, and texts follow the
+    make_comment_texts length distribution.
+    """
+    rng = np.random.default_rng(seed)
+    tickers = np.array([f"T{i:04d}" for i in range(n_tickers)], dtype=object)
+    dates = pd.bdate_range("2024-01-02", periods=n_days)
+    n_rows = n_tickers * n_days * comments_per_day
+    comment_time = np.repeat(
+        np.tile(dates.values, n_tickers), comments_per_day
+    ) + pd.to_timedelta(rng.integers(0, 24 * 3600, n_rows), unit="s").values
+    texts = make_comment_texts(n_rows, seed)
+    tags = np.array(["Bullish", "Bearish", None], dtype=object)
+    return pd.DataFrame(
+        {
+            "stock": np.repeat(tickers, n_days * comments_per_day),
+            "comment_time": pd.to_datetime(comment_time).to_pydatetime(),
+            "comments": [f"{text} #{i}" for i, text in enumerate(texts)],
+            "sentiment_tag": tags[rng.integers(0, 3, n_rows)],
+            "influence": rng.geometric(0.2, n_rows) - 1,
+        }
+    )
+
+
+def stub_classify(texts):
+    """Deterministic stand-in for the HuggingFace classifier, labelling texts by checksum."""
+    results = []
+    for text in texts:
+        checksum = zlib.crc32(text.encode("utf-8"))
+        results.append(
+            {
+                "label": STUB_LABELS[checksum % 3],
+                "score": 0.5 + (checksum % 500) / 1000,
+            }
+        )
+    return results
+
+
+def _time(timings, name, rows, func, *args, **kwargs):
+    """Runs func, recording its wall time and row throughput under name, and returns its result."""
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    elapsed = time.perf_counter() - start
+    timings[name] = {
+        "seconds": elapsed,
+        "rows": rows,
+        "rows_per_sec": rows / elapsed if elapsed > 0 else None,
+    }
+    return result
+
+
+def run_pipeline_once(n_tickers, n_days, comments_per_day, page_size=500, seed=0):
+    """Runs every pipeline stage once on synthetic data and returns the stage timings.
+
+    Stages: bulk comment ingest into SQLite, sentiment analysis with the stub
+    classifier (incremental daily totals), get_sentiment_score,
+    process_all_sheets, add_variation, panel preparation and estimate_gmm.
+    """
+    from datastorage import COMMENT_COLUMNS, get_all_sentiments, iter_comments
+    from data_clean import add_variation, process_all_sheets
+    from regression import estimate_gmm, generate_lagged_variables
+    from regression import prepare_data_for_panel_var
+    from sentiment_analysis import SCORE_COLUMNS, get_sentiment_score
+    from sentiment_analysis import sentiment_analysis
+    from storage import write_table
+
+    timings = {}
+    corpus = _time(
+        timings,
+        "generate_corpus",
+        n_tickers * n_days * comments_per_day,
+        make_corpus,
+        n_tickers,
+        n_days,
+        comments_per_day,
+        seed,
+    )
+    with make_session() as session:
+
+        def ingest():
+            for start in range(0, len(corpus), page_size):
+                save_to_database(corpus.iloc[start : start + page_size], session)
+
+        _time(timings, "save_to_database", len(corpus), ingest)
+        _time(
+            timings,
+            "sentiment_analysis",
+            len(corpus),
+            sentiment_analysis,
+            iter_comments(
+                session, columns=["comment_id"] + COMMENT_COLUMNS, unscored=True
+            ),
+            incremental=True,
+            db_session=session,
+            classify=stub_classify,
+        )
+        sentiments = _time(
+            timings,
+            "read_sentiments",
+            len(corpus),
+            get_all_sentiments,
+            session,
+            SCORE_COLUMNS,
+        )
+    scores = _time(
+        timings, "get_sentiment_score", len(sentiments), get_sentiment_score, sentiments
+    )
+
+    stock_data = make_ohlcv(n_tickers, n_days, seed)
+    merged = _time(
+        timings,
+        "process_all_sheets",
+        n_tickers * n_days,
+        process_all_sheets,
+        stock_data,
+        scores,
+    )
+    panel = _time(timings, "add_variation", len(merged), add_variation, merged)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "panel.parquet")
+        write_table(panel, path)
+        panel = _time(
+            timings, "prepare_panel", len(panel), prepare_data_for_panel_var, path
+        )
+    panel = generate_lagged_variables(panel, ["sentiment_score"], lags=3)
+    panel = panel.dropna(subset=[f"sentiment_score_lag{lag}" for lag in range(1, 4)])
+    _time(
+        timings,
+        "estimate_gmm",
+        len(panel),
+        estimate_gmm,
+        data=panel,
+        dependent_vars=["log_return", "log_volume"],
+        lags=3,
+        control_vars=["variation", "log_size"],
+        cache=False,
+    )
+    return timings
+
+
+def run_suite(n_tickers=30, n_days=250, comments_per_day=20, repeat=1, seed=0):
+    """Runs the pipeline benchmark repeat times and keeps the fastest time of each stage."""
+    best = {}
+    for _ in range(repeat):
+        for name, timing in run_pipeline_once(
+            n_tickers, n_days, comments_per_day, seed=seed
+        ).items():
+            if name not in best or timing["seconds"] < best[name]["seconds"]:
+                best[name] = timing
+    return {
+        "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "commit": _git_commit(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "scale": {
+            "tickers": n_tickers,
+            "days": n_days,
+            "comments_per_day": comments_per_day,
+            "repeat": repeat,
+            "seed": seed,
+        },
+        "stages": best,
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results):
+    table = pd.DataFrame.from_dict(results["stages"], orient="index")
+    print(f"scale: {results['scale']}")
+    print(table.to_string(float_format=lambda value: f"{value:,.3f}"))
+
+
+def save_baseline(results, path):
+    """Writes suite results to a JSON baseline file."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Baseline saved to {path}")
+
+
+def compare_to_baseline(results, path, tolerance=0.10):
+    """Compares stage times with a saved baseline and returns the stages slower by more than tolerance."""
+    with open(path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    if baseline["scale"] != results["scale"]:
+        print(
+            f"Warning: baseline scale {baseline['scale']} "
+            f"differs from {results['scale']}"
+        )
+    rows = []
+    for name, timing in results["stages"].items():
+        before = baseline["stages"].get(name, {}).get("seconds")
+        ratio = timing["seconds"] / before if before else None
+        if ratio is None:
+            status = "new"
+        elif ratio > 1 + tolerance:
+            status = "slower"
+        elif ratio < 1 - tolerance:
+            status = "faster"
+        else:
+            status = "same"
+        rows.append(
+            {
+                "stage": name,
+                "baseline_seconds": before,
+                "seconds": timing["seconds"],
+                "ratio": ratio,
+                "status": status,
+            }
+        )
+    comparison = pd.DataFrame(rows)
+    print(f"Compared with baseline {path} (commit {baseline.get('commit')}):")
+    print(comparison.to_string(index=False, float_format=lambda value: f"{value:,.3f}"))
+    return comparison.loc[comparison["status"] == "slower", "stage"].tolist()
+
+
+def run_microbenchmarks():
+    """Runs the individual before/after benchmarks of the optimized functions."""
+    benchmark_save_to_database()
+    benchmark_batching()
+    benchmark_sentiment_score()
+    benchmark_process_all_sheets()
+    benchmark_extraction()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Times every pipeline stage on synthetic data "
+        "with a stub classifier and SQLite."
+    )
+    parser.add_argument("--tickers", type=int, default=30)
+    parser.add_argument("--days", type=int, default=250)
+    parser.add_argument("--comments-per-day", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save-baseline", metavar="PATH")
+    parser.add_argument("--compare", metavar="PATH")
+    parser.add_argument("--tolerance", type=float, default=0.10)
+    parser.add_argument(
+        "--micro", action="store_true", help="run the per-function benchmarks instead"
+    )
+    args = parser.parse_args()
+    if args.micro:
+        run_microbenchmarks()
+        sys.exit(0)
+    results = run_suite(
+        args.tickers, args.days, args.comments_per_day, args.repeat, args.seed
+    )
+    print_results(results)
+    if args.save_baseline:
+        save_baseline(results, args.save_baseline)
+    if args.compare:
+        regressions = compare_to_baseline(results, args.compare, args.tolerance)
+        if regressions:
+            print(f"Slower than baseline: {', '.join(regressions)}")
+            sys.exit(1)
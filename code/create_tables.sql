@@ -5,11 +5,16 @@ CREATE TABLE comments (
     comment_time TIMESTAMP NOT NULL,    
     comments TEXT NOT NULL,         
     sentiment_tag VARCHAR(50),     
-    influence INT
+    influence INT,
+    content_hash CHAR(64)
 );
 
+-- Rescraped comments only refresh influence via INSERT ... ON CONFLICT (content_hash) DO UPDATE
+CREATE UNIQUE INDEX ix_comments_content_hash ON comments (content_hash);
+
 CREATE TABLE sentiment_score (
     id SERIAL PRIMARY KEY,              
+    comment_id INT REFERENCES comments (id),
     stock VARCHAR(50) NOT NULL,          
     comment_time TIMESTAMP NOT NULL,    
     comments TEXT NOT NULL,         
@@ -17,4 +22,18 @@ CREATE TABLE sentiment_score (
     influence INT,                 
     sentiment VARCHAR(50) NOT NULL,
     score REAL NOT NULL   
-);
\ No newline at end of file
+);
+
+-- One result per comment; incremental runs upsert on comment_id
+CREATE UNIQUE INDEX ix_sentiment_score_comment_id ON sentiment_score (comment_id);
+
+-- Running per-stock-day totals, updated incrementally as new comments are scored
+CREATE TABLE daily_sentiment (
+    stock VARCHAR(50) NOT NULL,
+    date DATE NOT NULL,
+    positive_weighted DOUBLE PRECISION NOT NULL,
+    negative_weighted DOUBLE PRECISION NOT NULL,
+    total_posts INT NOT NULL,
+    sentiment_score DOUBLE PRECISION NOT NULL,
+    PRIMARY KEY (stock, date)
+);
@@ -1,5 +1,19 @@
+import glob
+import hashlib
 import os
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
+from dotenv import load_dotenv
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from datastorage import get_daily_sentiment
+from storage import read_table, write_table, legacy_excel_path
+from pipeline_runner import Pipeline
+from instrumentation import count, stage, timed, write_report
+
+SENTIMENT_START_DATE = "2024-08-01"
+STOCK_CACHE_DIR = "data/.cache/financialdata"
+PIPELINE_CACHE_DIR = "data/.cache/pipeline"
 
 
 def get_url(path):
@@ -17,31 +31,124 @@ def get_url(path):
     return url_list, stock_name
 
 
-def read_stock_data(folder_path, stock_path):
-    """Reads financial data in the folder, excluding specific ones, and returns a dictionary of DataFrames."""
+def _resolve_stock_file(file_path):
+    """Returns file_path, or the legacy Excel file with the same stem if it does not exist."""
+    if not os.path.exists(file_path) and legacy_excel_path(file_path):
+        return legacy_excel_path(file_path)
+    return file_path
+
+
+def _stock_cache_path(file_path, cache_dir):
+    """Returns the cache file for file_path, keyed by its absolute path, mtime and size."""
+    stat = os.stat(file_path)
+    path_key = hashlib.sha1(os.path.abspath(file_path).encode("utf-8")).hexdigest()
+    version = hashlib.sha1(f"{stat.st_mtime_ns}|{stat.st_size}".encode()).hexdigest()
+    return os.path.join(cache_dir, f"{path_key}-{version[:16]}.parquet")
+
+
+def _read_cached_stock_file(file_path, cache_dir):
+    """Returns the cached parsed copy of file_path if it is up to date, else None."""
+    if not cache_dir or file_path.endswith(".parquet"):
+        return None
+    cache_path = _stock_cache_path(file_path, cache_dir)
+    if os.path.exists(cache_path):
+        return pd.read_parquet(cache_path)
+    return None
+
+
+def load_stock_file(file_path, cache_dir=None):
+    """Reads and parses one ticker file, storing a Parquet copy in cache_dir.
+
+    Non-Parquet sources are cached under a key of path, mtime and size, so a
+    changed file is parsed again and its stale cache entries are removed.
+    """
+    stock_df = read_table(file_path)
+    if "date" in stock_df.columns:
+        stock_df["date"] = pd.to_datetime(stock_df["date"], errors="coerce")
+    if cache_dir and not file_path.endswith(".parquet"):
+        os.makedirs(cache_dir, exist_ok=True)
+        cache_path = _stock_cache_path(file_path, cache_dir)
+        for stale in glob.glob(cache_path.rsplit("-", 1)[0] + "-*.parquet"):
+            os.remove(stale)
+        temporary_path = f"{cache_path}.{os.getpid()}.tmp"
+        stock_df.to_parquet(temporary_path, index=False)
+        os.replace(temporary_path, cache_path)
+    return stock_df
+
+
+@timed()
+def read_stock_data(
+    folder_path,
+    stock_path,
+    suffix=".parquet",
+    cache_dir=STOCK_CACHE_DIR,
+    max_workers=None,
+):
+    """Reads financial data in the folder, excluding specific ones, and returns a dictionary of DataFrames.
+
+    Unchanged files are served from the parsed cache; the remaining tickers
+    are parsed concurrently in a process pool.
+    """
     url_list, stock_name = get_url(stock_path)
+    file_paths = {
+        stock: _resolve_stock_file(os.path.join(folder_path, stock + suffix))
+        for stock in stock_name
+    }
     stock_data = {}
-    for stock in stock_name:
-        file_name = stock + ".xlsx"
-        file_path = os.path.join(folder_path, file_name)
-        stock_df = pd.read_excel(file_path, engine="openpyxl")
-        if "date" in stock_df.columns:
-            stock_df["date"] = pd.to_datetime(stock_df["date"], errors="coerce")
-        stock_data[stock] = stock_df
-    return stock_data
-
-
-def read_sentiment_data(file_path):
-    """Reads sentiment data and ensures 'date' and 'stock' columns are present."""
-    sentiment_df = pd.read_excel(file_path, engine="openpyxl")
+    missing = []
+    for stock, file_path in file_paths.items():
+        cached = _read_cached_stock_file(file_path, cache_dir)
+        if cached is None:
+            missing.append(stock)
+        else:
+            stock_data[stock] = cached
+    if len(missing) > 1 and max_workers != 1:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            frames = executor.map(
+                load_stock_file,
+                [file_paths[stock] for stock in missing],
+                [cache_dir] * len(missing),
+            )
+            stock_data.update(zip(missing, frames))
+    else:
+        for stock in missing:
+            stock_data[stock] = load_stock_file(file_paths[stock], cache_dir)
+    return {stock: stock_data[stock] for stock in stock_name}
+
+
+def read_sentiment_data(file_path, columns=None):
+    """Reads sentiment data and ensures 'date' and 'stock' columns are present.
+
+    The date cut-off is pushed down to the reader, so Parquet row groups
+    before it are skipped.
+    """
+    sentiment_df = read_table(
+        file_path,
+        columns=columns,
+        filters=[("date", ">=", pd.Timestamp(SENTIMENT_START_DATE))],
+    )
     if "date" in sentiment_df.columns:
         sentiment_df["date"] = pd.to_datetime(sentiment_df["date"], errors="coerce")
-        sentiment_df = sentiment_df[sentiment_df["date"] >= "2024-08-01"]
     if "stock" not in sentiment_df.columns and "company" in sentiment_df.columns:
         sentiment_df["stock"] = sentiment_df["company"]
     return sentiment_df
 
 
+def read_sentiment_data_from_database(
+    session, start_date=SENTIMENT_START_DATE, cache_path=None
+):
+    """Reads daily sentiment scores directly from the 'daily_sentiment' table.
+
+    With cache_path the scores are also saved there, so a run without
+    database access can read them back with read_sentiment_data.
+    """
+    sentiment_df = get_daily_sentiment(session, start_date=start_date)
+    sentiment_df["date"] = pd.to_datetime(sentiment_df["date"], errors="coerce")
+    if cache_path:
+        write_table(sentiment_df, cache_path)
+    return sentiment_df
+
+
 def merge_data(stock_df, sentiment_df, company_name):
     """Merges stock data with sentiment data on 'date' and 'stock' columns, filtering sentiment = 0."""
     if "stock" not in stock_df.columns:
@@ -53,32 +160,61 @@ def merge_data(stock_df, sentiment_df, company_name):
 
 
 def process_all_sheets(stock_data, sentiment_data):
-    """Processes all stock data sheets, merges them with sentiment data, and combines the results."""
-    combined_data = [
-        merge_data(stock_df, sentiment_data, company)
+    """Processes all stock data sheets, merges them with sentiment data, and combines the results.
+
+    All ticker frames are concatenated once, dates are parsed once and a
+    single inner merge is done on a categorical (stock, date) key. The result
+    matches merging each ticker separately with merge_data and concatenating.
+    """
+    if not stock_data:
+        return pd.DataFrame()
+    frames = [
+        stock_df if "stock" in stock_df.columns else stock_df.assign(stock=company)
         for company, stock_df in stock_data.items()
     ]
-    return (
-        pd.concat(combined_data, ignore_index=True) if combined_data else pd.DataFrame()
+    stocks = pd.concat(frames, ignore_index=True)
+    stock_type = pd.CategoricalDtype(stocks["stock"].unique())
+    stocks["stock"] = stocks["stock"].astype(stock_type)
+    stocks["date"] = pd.to_datetime(stocks["date"], errors="coerce")
+    sentiment = sentiment_data[sentiment_data["stock"].isin(stock_type.categories)]
+    sentiment = sentiment.assign(
+        stock=sentiment["stock"].astype(stock_type),
+        date=pd.to_datetime(sentiment["date"], errors="coerce"),
     )
+    merged = pd.merge(stocks, sentiment, on=["date", "stock"], how="inner")
+    merged = merged[merged["sentiment_score"] != 0].reset_index(drop=True)
+    merged["stock"] = merged["stock"].astype(object)
+    return merged
+
+
+def add_variation(data):
+    """Returns the data with a 'variation' column using (high - low) / low, excluding unnecessary columns."""
+    if {"high", "low"}.issubset(data.columns):
+        data = data.assign(variation=(data["high"] - data["low"]) / data["low"])
+        data = data.drop(columns=["open", "close"], errors="ignore")
+    return data
 
 
 def add_variation_column(file_path, output_path):
     """Adds a 'variation' column to the data using (high - low), excluding unnecessary columns."""
-    data = pd.read_excel(file_path, engine="openpyxl")
+    data = read_table(file_path)
     if {"high", "low"}.issubset(data.columns):
-        data["variation"] = (data["high"] - data["low"]) / data["low"]
-        data = data.drop(columns=["open", "close"], errors="ignore")
-        data.to_excel(output_path, index=False)
+        write_table(add_variation(data), output_path, partition_cols=["stock"])
 
 
-def add_dowjones_return_column(file_path, output_path):
-    """Calculates Dow Jones return as (high - low) / low and saves the result."""
-    dowjones_df = pd.read_excel(file_path, engine="openpyxl")
+def add_dowjones_return(dowjones_df):
+    """Returns the Dow Jones data sorted by date with the daily close-to-close return in percent."""
     if {"date", "close"}.issubset(dowjones_df.columns):
         dowjones_df = dowjones_df.sort_values("date")
-        dowjones_df["return"] = dowjones_df["close"].pct_change() * 100
-    dowjones_df.to_excel(output_path, index=False)
+        dowjones_df = dowjones_df.assign(
+            **{"return": dowjones_df["close"].pct_change() * 100}
+        )
+    return dowjones_df
+
+
+def add_dowjones_return_column(file_path, output_path):
+    """Calculates Dow Jones return as (high - low) / low and saves the result."""
+    write_table(add_dowjones_return(read_table(file_path)), output_path)
 
 
 def calculate_weighted_sentiment(sentiment_data, dowjones_data):
@@ -106,14 +242,69 @@ def calculate_weighted_sentiment(sentiment_data, dowjones_data):
     )
 
 
+def combine_dowjones_sentiment(dowjones_df, sentiment_df):
+    """Parses dates and merges the size-weighted daily sentiment into the Dow Jones data."""
+    dowjones_df = dowjones_df.assign(
+        date=pd.to_datetime(dowjones_df["date"], errors="coerce")
+    )
+    sentiment_df = sentiment_df[["date", "sentiment_score", "size"]].assign(
+        date=pd.to_datetime(sentiment_df["date"], errors="coerce")
+    )
+    return calculate_weighted_sentiment(sentiment_df, dowjones_df)
+
+
+def build_pipeline(
+    stock_sentiment_output=None,
+    variation_output=None,
+    dowjones_return_output=None,
+    dowjones_sentiment_output=None,
+    cache_dir=PIPELINE_CACHE_DIR,
+):
+    """Builds the in-memory cleaning pipeline; each *_output path is an optional sink.
+
+    Sources: 'stock_data' (dict of ticker frames), 'sentiment_data' and 'dowjones'.
+    """
+    return (
+        Pipeline(cache_dir=cache_dir)
+        .add(
+            "stock_sentiment",
+            process_all_sheets,
+            ["stock_data", "sentiment_data"],
+            sink=stock_sentiment_output,
+            partition_cols=["stock"],
+        )
+        .add(
+            "stock_sentiment_variation",
+            add_variation,
+            ["stock_sentiment"],
+            sink=variation_output,
+            partition_cols=["stock"],
+        )
+        .add(
+            "dowjones_return",
+            add_dowjones_return,
+            ["dowjones"],
+            sink=dowjones_return_output,
+        )
+        .add(
+            "dowjones_sentiment",
+            combine_dowjones_sentiment,
+            ["dowjones_return", "stock_sentiment"],
+            sink=dowjones_sentiment_output,
+        )
+    )
+
+
 def process_combined_data(dowjones_file_path, sentiment_file_path, output_path):
     """Processes Dow Jones and sentiment data, calculates daily weighted sentiment, and saves the result."""
-    dowjones_df = pd.read_excel(dowjones_file_path, engine="openpyxl")
-    sentiment_df = pd.read_excel(sentiment_file_path, engine="openpyxl")
+    dowjones_df = read_table(dowjones_file_path)
+    sentiment_df = read_table(
+        sentiment_file_path, columns=["date", "sentiment_score", "size"]
+    )
     dowjones_df["date"] = pd.to_datetime(dowjones_df["date"], errors="coerce")
     sentiment_df["date"] = pd.to_datetime(sentiment_df["date"], errors="coerce")
     combined_data = calculate_weighted_sentiment(sentiment_df, dowjones_df)
-    combined_data.to_excel(output_path, index=False)
+    write_table(combined_data, output_path)
 
 
 def save_to_excel(df, output_path):
@@ -121,25 +312,52 @@ def save_to_excel(df, output_path):
     df.to_excel(output_path, index=False)
 
 
+def save_table(df, output_path, partition_cols=None):
+    """Saves the DataFrame in the format given by the path suffix (Parquet by default)."""
+    write_table(df, output_path, partition_cols=partition_cols)
+
+
 if __name__ == "__main__":
     DATA_DIR = "data/financialdata"
     stock_path = "data/Dow_Jones_Average_Index_companies.xlsx"
-    STOCK_SENTIMENT_OUTPUT = "data/processed_stock_sentiment_data.xlsx"
+    STOCK_SENTIMENT_OUTPUT = "data/processed_stock_sentiment_data.parquet"
     STOCK_SENTIMENT_VARIATION_OUTPUT = (
-        "data/processed_stock_sentiment_data_with_variation.xlsx"
+        "data/processed_stock_sentiment_data_with_variation.parquet"
     )
-    DOWJONES_FILE = os.path.join(DATA_DIR, "dowjones_data.xlsx")
-    DOWJONES_OUTPUT_FILE = os.path.join(DATA_DIR, "dowjones_data_with_return.xlsx")
-    DOWJONES_SENTIMENT_OUTPUT = "data/processed_dowjones.xlsx"
-    sentiment_file_path = "data/sentiment_score.xlsx"
+    DOWJONES_FILE = os.path.join(DATA_DIR, "dowjones_data.parquet")
+    DOWJONES_OUTPUT_FILE = os.path.join(DATA_DIR, "dowjones_data_with_return.parquet")
+    DOWJONES_SENTIMENT_OUTPUT = "data/processed_dowjones.parquet"
+    sentiment_file_path = "data/sentiment_score.parquet"
+    SENTIMENT_FROM_DATABASE = True
 
+    pipeline = build_pipeline(
+        stock_sentiment_output=STOCK_SENTIMENT_OUTPUT,
+        variation_output=STOCK_SENTIMENT_VARIATION_OUTPUT,
+        dowjones_return_output=DOWJONES_OUTPUT_FILE,
+        dowjones_sentiment_output=DOWJONES_SENTIMENT_OUTPUT,
+    )
     stock_data = read_stock_data(DATA_DIR, stock_path)
-    sentiment_data = read_sentiment_data(sentiment_file_path)
-    final_data = process_all_sheets(stock_data, sentiment_data)
-    save_to_excel(final_data, STOCK_SENTIMENT_OUTPUT)
-    add_variation_column(STOCK_SENTIMENT_OUTPUT, STOCK_SENTIMENT_VARIATION_OUTPUT)
-
-    add_dowjones_return_column(DOWJONES_FILE, DOWJONES_OUTPUT_FILE)
-    process_combined_data(
-        DOWJONES_OUTPUT_FILE, STOCK_SENTIMENT_OUTPUT, DOWJONES_SENTIMENT_OUTPUT
+    count("stock_files", len(stock_data))
+    with stage("read_sentiment_data"):
+        if SENTIMENT_FROM_DATABASE:
+            load_dotenv()
+            DATABASE_USERNAME = os.getenv("DATABASE_USERNAME")
+            DATABASE_PASSWORD = os.getenv("DATABASE_PASSWORD")
+            DATABASE_HOST = os.getenv("DATABASE_HOST")
+            DATABASE_PORT = os.getenv("DATABASE_PORT")
+            DATABASE_DATABASE = os.getenv("DATABASE_DATABASE")
+            SQLALCHEMY_DATABASE_URL = f"postgresql://{DATABASE_USERNAME}:{DATABASE_PASSWORD}@{DATABASE_HOST}:{DATABASE_PORT}/{DATABASE_DATABASE}"
+            with sessionmaker(bind=create_engine(SQLALCHEMY_DATABASE_URL))() as session:
+                sentiment_data = read_sentiment_data_from_database(
+                    session, cache_path=sentiment_file_path
+                )
+        else:
+            sentiment_data = read_sentiment_data(sentiment_file_path)
+    pipeline.run(
+        {
+            "stock_data": stock_data,
+            "sentiment_data": sentiment_data,
+            "dowjones": read_table(DOWJONES_FILE),
+        }
     )
+    write_report()
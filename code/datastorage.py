@@ -1,15 +1,26 @@
 from sqlalchemy.orm import declarative_base
-from sqlalchemy import Column, Integer, String, Text, TIMESTAMP, Float
-from sqlalchemy import create_engine
+from sqlalchemy import Column, Integer, String, Text, TIMESTAMP, Float, ForeignKey
+from sqlalchemy import Date, DateTime
+from sqlalchemy import create_engine, select, inspect, text, bindparam, exists
+from sqlalchemy import and_, or_, tuple_
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.orm import sessionmaker
+import hashlib
+import io
 import os
 import dotenv
 import pandas as pd
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
+from scoring import TOTAL_COLUMNS, combine_totals, daily_sentiment_totals
+from scoring import ERROR_LABEL, scores_from_totals
+from instrumentation import count, timed
 
 Base = declarative_base()
 
+COMMENT_COLUMNS = ["stock", "comment_time", "comments", "sentiment_tag", "influence"]
+SENTIMENT_COLUMNS = COMMENT_COLUMNS + ["sentiment", "score"]
+
 
 class Comment(Base):
     __tablename__ = "comments"
@@ -20,49 +31,395 @@ class Comment(Base):
     comments = Column(Text)
     sentiment_tag = Column(String(50))
     influence = Column(Integer)
+    content_hash = Column(String(64), index=True, unique=True)
+
+
+def content_hash(data):
+    """Return the SHA-256 hex digest of each row's comment fields.
+
+    Values are normalized first so a comment scraped as a date string and the
+    same comment read back from the database as a timestamp hash identically.
+    Influence is left out, as in scrape_state.message_key, because like and
+    reply counts change between runs.
+    """
+    comment_time = pd.to_datetime(data["comment_time"]).dt.strftime("%Y-%m-%d %H:%M:%S")
+    parts = [
+        data["stock"].fillna("").astype(str),
+        comment_time.fillna(""),
+        data["comments"].fillna("").astype(str),
+        data["sentiment_tag"].fillna("").astype(str),
+    ]
+    joined = parts[0].str.cat(parts[1:], sep="\x1f")
+    return joined.map(lambda value: hashlib.sha256(value.encode("utf-8")).hexdigest())
 
 
 def save_to_database(data, session):
-    """Save data to the 'comments' table in the database."""
-    for _, row in data.iterrows():
-        comment = Comment(
-            stock=row["stock"],
-            comment_time=row["comment_time"],
-            comments=row["comments"],
-            sentiment_tag=row["sentiment_tag"],
-            influence=row["influence"],
-        )
-        session.add(comment)
-    session.commit()
-    print("Data successfully saved to database.")
+    """Save data to the 'comments' table in the database, skipping comments already stored."""
+    return bulk_save_to_database(data, session)
+
+
+def _to_records(data, columns):
+    """Convert DataFrame rows to plain dicts, replacing missing values with None."""
+    frame = data[columns].astype(object)
+    frame = frame.where(pd.notna(frame), None)
+    return frame.to_dict("records")
+
+
+def _copy_to_postgres(
+    data, session, table, columns, conflict_columns=None, update_columns=None
+):
+    """Stream a DataFrame into a PostgreSQL table with COPY ... FROM STDIN.
+
+    With conflict_columns the rows are copied into a temporary staging table
+    and moved over with INSERT ... ON CONFLICT, either skipping conflicting
+    rows or updating update_columns on them where they differ. Returns the
+    number of rows inserted or updated.
+    """
+    buffer = io.StringIO()
+    data[columns].to_csv(buffer, index=False, header=False)
+    buffer.seek(0)
+    column_list = ", ".join(columns)
+    connection = session.connection().connection
+    cursor = connection.cursor()
+    try:
+        if not conflict_columns:
+            cursor.copy_expert(
+                f"COPY {table.name} ({column_list}) FROM STDIN WITH (FORMAT csv)",
+                buffer,
+            )
+            return len(data)
+        staging = f"{table.name}_staging"
+        cursor.execute(
+            f"CREATE TEMP TABLE IF NOT EXISTS {staging} ON COMMIT DROP AS "
+            f"SELECT {column_list} FROM {table.name} WITH NO DATA"
+        )
+        cursor.copy_expert(
+            f"COPY {staging} ({column_list}) FROM STDIN WITH (FORMAT csv)", buffer
+        )
+        if update_columns:
+            assignments = ", ".join(f"{c} = EXCLUDED.{c}" for c in update_columns)
+            changed = " OR ".join(
+                f"{table.name}.{c} IS DISTINCT FROM EXCLUDED.{c}" for c in update_columns
+            )
+            action = f"DO UPDATE SET {assignments} WHERE {changed}"
+        else:
+            action = "DO NOTHING"
+        cursor.execute(
+            f"INSERT INTO {table.name} ({column_list}) "
+            f"SELECT {column_list} FROM {staging} "
+            f"ON CONFLICT ({', '.join(conflict_columns)}) {action}"
+        )
+        written = cursor.rowcount
+        cursor.execute(f"TRUNCATE {staging}")
+        return written
+    finally:
+        cursor.close()
+
+
+def _coerce_temporal(data, table, columns):
+    """Parse date and timestamp columns given as strings, as the ORM would on insert.
+
+    executemany binds values directly, and SQLite's DateTime and Date types
+    reject strings such as the scraper's 'YYYY-MM-DD' comment times.
+    """
+    converted = {}
+    for column in columns:
+        column_type = table.c[column].type
+        if isinstance(column_type, DateTime):
+            converted[column] = pd.to_datetime(data[column]).astype(object)
+        elif isinstance(column_type, Date):
+            converted[column] = pd.to_datetime(data[column]).dt.date
+    return data.assign(**converted) if converted else data
+
 
+def _insert_statement(session, table, conflict_columns=None, update_columns=None):
+    """Build an INSERT for the session's dialect with ON CONFLICT handling where supported."""
+    dialect = session.get_bind().dialect.name
+    if not conflict_columns or dialect not in ("postgresql", "sqlite"):
+        return table.insert()
+    insert = (postgresql.insert if dialect == "postgresql" else sqlite.insert)(table)
+    if update_columns:
+        return insert.on_conflict_do_update(
+            index_elements=conflict_columns,
+            set_={column: insert.excluded[column] for column in update_columns},
+            where=or_(
+                *[
+                    table.c[column].is_distinct_from(insert.excluded[column])
+                    for column in update_columns
+                ]
+            ),
+        )
+    return insert.on_conflict_do_nothing(index_elements=conflict_columns)
+
+
+@timed("db_write")
+def bulk_save_to_database(
+    data,
+    session,
+    table=None,
+    conflict_columns=None,
+    update_columns=None,
+    chunk_size=10000,
+    commit=True,
+):
+    """Bulk insert a DataFrame into a table without building ORM objects.
+
+    PostgreSQL uses COPY; other dialects use batched executemany inserts.
+    Rows conflicting on conflict_columns are skipped, or have update_columns
+    overwritten where they differ when given. Writes to the comments table
+    (the default) are keyed on content_hash, so comments that are already
+    stored are not inserted again; only their influence is refreshed.
+    Returns the number of rows actually inserted or updated. With
+    commit=False the rows are left in the session's open transaction;
+    otherwise a failed write is rolled back before the error is raised, so
+    the session stays usable.
+    """
+    if table is None:
+        table = Comment.__table__
+        data = data.assign(content_hash=content_hash(data)).drop_duplicates(
+            subset=["content_hash"]
+        )
+        conflict_columns = ["content_hash"]
+        update_columns = ["influence"]
+    if data.empty:
+        return 0
+    columns = [c.name for c in table.columns if c.name in data.columns]
+    data = _coerce_temporal(data, table, columns)
+    written = 0
+    try:
+        if session.get_bind().dialect.name == "postgresql":
+            for start in range(0, len(data), chunk_size):
+                written += _copy_to_postgres(
+                    data.iloc[start : start + chunk_size],
+                    session,
+                    table,
+                    columns,
+                    conflict_columns,
+                    update_columns,
+                )
+        else:
+            insert = _insert_statement(session, table, conflict_columns, update_columns)
+            for start in range(0, len(data), chunk_size):
+                records = _to_records(data.iloc[start : start + chunk_size], columns)
+                result = session.execute(insert, records)
+                written += result.rowcount if result.rowcount >= 0 else len(records)
+        if commit:
+            session.commit()
+    except Exception:
+        if commit:
+            session.rollback()
+        raise
+    count("db_rows", written)
+    skipped = len(data) - written
+    print(
+        f"{written} rows successfully saved to database"
+        + (f" ({skipped} already stored unchanged)." if skipped > 0 else ".")
+    )
+    return written
 
-def get_all_comments(session):
+
+def _typed_chunk(rows, columns):
+    """Build a DataFrame chunk from result rows with consistent column dtypes."""
+    chunk = pd.DataFrame.from_records(rows, columns=columns)
+    if "comment_time" in chunk.columns:
+        chunk["comment_time"] = pd.to_datetime(chunk["comment_time"])
+    if "influence" in chunk.columns:
+        chunk["influence"] = pd.to_numeric(chunk["influence"]).astype("Int64")
+    if "score" in chunk.columns:
+        chunk["score"] = chunk["score"].astype("float64")
+    return chunk
+
+
+def _table_column(table, name):
+    """Look up a column by name; 'comment_id' on the comments table aliases its id."""
+    if name == "comment_id" and "comment_id" not in table.c:
+        return table.c.id.label("comment_id")
+    return table.c[name]
+
+
+def iter_table(session, table, columns, chunk_size=10000, where=None):
+    """Yield DataFrame chunks of the selected columns using a server-side cursor.
+
+    The rows are streamed on a separate connection, so callers can commit on
+    the session between chunks without closing the cursor.
+    """
+    query = select(*[_table_column(table, column) for column in columns])
+    if where is not None:
+        query = query.where(where)
+    query = query.order_by(table.c.id)
+    with session.get_bind().connect() as connection:
+        result = connection.execution_options(stream_results=True).execute(query)
+        for rows in result.partitions(chunk_size):
+            yield _typed_chunk(rows, columns)
+
+
+def _concat_chunks(chunks, columns):
+    """Concatenate DataFrame chunks, returning an empty frame if there are none."""
+    chunks = list(chunks)
+    if not chunks:
+        return pd.DataFrame(columns=columns)
+    return pd.concat(chunks, ignore_index=True)
+
+
+def iter_comments(session, columns=None, chunk_size=10000, unscored=False):
+    """Yield comments from the database in DataFrame chunks.
+
+    With unscored=True only comments without a usable row in sentiment_score
+    are returned; those whose inference failed are returned again so they are
+    retried. Request the 'comment_id' column to link results back to them.
+    """
+    columns = columns or COMMENT_COLUMNS
+    where = None
+    if unscored:
+        where = ~exists().where(
+            and_(
+                SentimentAnalysis.comment_id == Comment.id,
+                SentimentAnalysis.sentiment != ERROR_LABEL,
+            )
+        )
+    return iter_table(session, Comment.__table__, columns, chunk_size, where)
+
+
+def get_all_comments(session, columns=None):
     """Retrieve all comments data from the database."""
-    query = session.query(Comment)
-    data = pd.DataFrame(
-        [
-            {
-                "stock": row.stock,
-                "comment_time": row.comment_time,
-                "comments": row.comments,
-                "sentiment_tag": row.sentiment_tag,
-                "influence": row.influence,
-            }
-            for row in query
-        ]
+    columns = columns or COMMENT_COLUMNS
+    return _concat_chunks(iter_comments(session, columns), columns)
+
+
+def backfill_content_hash(session, chunk_size=10000):
+    """One-time migration for tables created before content_hash existed.
+
+    Adds the column, hashes existing rows in id order, deletes rows whose hash
+    was already seen (with any sentiment results linked to them) and finally
+    creates the unique index. Returns the number of rows deleted.
+    """
+    table = Comment.__table__
+    existing = {c["name"] for c in inspect(session.get_bind()).get_columns(table.name)}
+    if "content_hash" not in existing:
+        session.execute(text(f"ALTER TABLE {table.name} ADD COLUMN content_hash VARCHAR(64)"))
+        session.commit()
+    seen = set(
+        session.execute(
+            select(table.c.content_hash).where(table.c.content_hash.isnot(None))
+        ).scalars()
     )
-    data = data.drop_duplicates(
-        subset=["stock", "comment_time", "comments", "sentiment_tag", "influence"]
+    update = (
+        table.update()
+        .where(table.c.id == bindparam("row_id"))
+        .values(content_hash=bindparam("row_hash"))
     )
-    data = data.reset_index(drop=True)
-    return data
+    hashed, removed = 0, 0
+    while True:
+        query = (
+            select(table.c.id, *[table.c[column] for column in COMMENT_COLUMNS])
+            .where(table.c.content_hash.is_(None))
+            .order_by(table.c.id)
+            .limit(chunk_size)
+        )
+        rows = session.execute(query).all()
+        if not rows:
+            break
+        chunk = _typed_chunk(rows, ["id"] + COMMENT_COLUMNS)
+        chunk["content_hash"] = content_hash(chunk)
+        duplicate = chunk["content_hash"].isin(seen) | chunk["content_hash"].duplicated()
+        duplicate_ids = [int(row_id) for row_id in chunk.loc[duplicate, "id"]]
+        if duplicate_ids:
+            if "comment_id" in (_column_names(session, SentimentAnalysis.__table__) or ()):
+                session.execute(
+                    SentimentAnalysis.__table__.delete().where(
+                        SentimentAnalysis.__table__.c.comment_id.in_(duplicate_ids)
+                    )
+                )
+            session.execute(table.delete().where(table.c.id.in_(duplicate_ids)))
+        kept = chunk[~duplicate]
+        if not kept.empty:
+            session.execute(
+                update,
+                [
+                    {"row_id": int(row_id), "row_hash": row_hash}
+                    for row_id, row_hash in zip(kept["id"], kept["content_hash"])
+                ],
+            )
+        seen.update(kept["content_hash"])
+        session.commit()
+        hashed += len(kept)
+        removed += len(duplicate_ids)
+    session.execute(
+        text(
+            f"CREATE UNIQUE INDEX IF NOT EXISTS ix_{table.name}_content_hash "
+            f"ON {table.name} (content_hash)"
+        )
+    )
+    session.commit()
+    print(f"Backfilled {hashed} comment hashes and removed {removed} duplicates.")
+    return removed
+
+
+def _stale_hashes(session):
+    """Return whether stored content hashes were computed with an older content_hash."""
+    table = Comment.__table__
+    row = session.execute(
+        select(
+            table.c.id,
+            *[table.c[column] for column in COMMENT_COLUMNS],
+            table.c.content_hash,
+        )
+        .where(table.c.content_hash.isnot(None))
+        .order_by(table.c.id)
+        .limit(1)
+    ).first()
+    if row is None:
+        return False
+    chunk = _typed_chunk([row[:-1]], ["id"] + COMMENT_COLUMNS)
+    return content_hash(chunk).iloc[0] != row[-1]
+
+
+def _column_names(session, table):
+    """Return the names of the table's columns in the database, or None if it does not exist."""
+    inspector = inspect(session.get_bind())
+    if not inspector.has_table(table.name):
+        return None
+    return {c["name"] for c in inspector.get_columns(table.name)}
+
+
+def migrate_database(session):
+    """Bring a database created by an earlier version of the scripts up to the current schema.
+
+    Run at the start of every entry point that writes to the database. Each
+    migration only runs when its table still has the old layout, so on an
+    up-to-date database this just inspects the schema. The order matters:
+    duplicate comments are deleted by the content_hash backfill before
+    sentiment results are linked to comments by comment_id. Hashes computed
+    by an older content_hash are cleared and backfilled again, and the daily
+    totals are rebuilt if that deleted duplicates. Tables that do not exist
+    yet, such as daily_sentiment, are created last.
+    """
+    comment_columns = _column_names(session, Comment.__table__)
+    removed = 0
+    if comment_columns is not None and "content_hash" in comment_columns:
+        if _stale_hashes(session):
+            session.execute(Comment.__table__.update().values(content_hash=None))
+            session.commit()
+    if comment_columns is not None and (
+        "content_hash" not in comment_columns
+        or session.execute(
+            select(Comment.id).where(Comment.content_hash.is_(None)).limit(1)
+        ).first()
+    ):
+        removed = backfill_content_hash(session)
+    sentiment_columns = _column_names(session, SentimentAnalysis.__table__)
+    if sentiment_columns is not None and "comment_id" not in sentiment_columns:
+        backfill_sentiment_comment_id(session)
+    Base.metadata.create_all(session.get_bind())
+    if removed and not get_daily_sentiment(session).empty:
+        rebuild_daily_sentiment(session)
 
 
 class SentimentAnalysis(Base):
     __tablename__ = "sentiment_score"
 
     id = Column(Integer, primary_key=True, autoincrement=True)
+    comment_id = Column(Integer, ForeignKey("comments.id"), index=True, unique=True)
     stock = Column(String(50))
     comment_time = Column(TIMESTAMP)
     comments = Column(Text)
@@ -72,38 +429,237 @@ class SentimentAnalysis(Base):
     score = Column(Float)
 
 
-def save_sentiment(data, session):
-    """Save sentiment analysis results to the 'sentiment_score' table in the database."""
-    for _, row in data.iterrows():
-        sentiment_entry = SentimentAnalysis(
-            stock=row["stock"],
-            comment_time=row["comment_time"],
-            comments=row["comments"],
-            sentiment_tag=row["sentiment_tag"],
-            influence=row["influence"],
-            sentiment=row["sentiment"],
-            score=row["score"],
+def save_sentiment(data, session, commit=True):
+    """Save sentiment analysis results to the 'sentiment_score' table in the database.
+
+    Results carrying a comment_id are upserted, so re-scoring a comment
+    replaces its previous label and score instead of adding a new row.
+    """
+    if "comment_id" not in data.columns:
+        return bulk_save_to_database(
+            data, session, table=SentimentAnalysis.__table__, commit=commit
         )
-        session.add(sentiment_entry)
+    return bulk_save_to_database(
+        data,
+        session,
+        table=SentimentAnalysis.__table__,
+        conflict_columns=["comment_id"],
+        update_columns=["sentiment", "score"],
+        commit=commit,
+    )
+
+
+def backfill_sentiment_comment_id(session, chunk_size=10000):
+    """One-time migration linking existing sentiment_score rows to their comments.
+
+    Each chunk of rows is hashed with content_hash and looked up through the
+    unique index on comments.content_hash, so the migration stays linear in
+    the table sizes; duplicate results for the same comment are deleted,
+    keeping the earliest one. Requires the
+    content_hash backfill to have run first, otherwise rows could be linked
+    to duplicate comments it later deletes; migrate_database runs both in
+    the right order.
+    """
+    comment_columns = _column_names(session, Comment.__table__) or set()
+    if "content_hash" not in comment_columns or session.execute(
+        select(Comment.id).where(Comment.content_hash.is_(None)).limit(1)
+    ).first():
+        raise RuntimeError(
+            "Run backfill_content_hash before backfill_sentiment_comment_id "
+            "(or use migrate_database)."
+        )
+    table = SentimentAnalysis.__table__
+    existing = {c["name"] for c in inspect(session.get_bind()).get_columns(table.name)}
+    if "comment_id" not in existing:
+        session.execute(
+            text(
+                f"ALTER TABLE {table.name} ADD COLUMN comment_id INTEGER "
+                "REFERENCES comments (id)"
+            )
+        )
+    comments = Comment.__table__
+    link = (
+        table.update()
+        .where(table.c.id == bindparam("row_id"))
+        .values(comment_id=bindparam("linked_id"))
+    )
+    last_id = 0
+    while True:
+        rows = session.execute(
+            select(table.c.id, *[table.c[column] for column in COMMENT_COLUMNS])
+            .where(table.c.comment_id.is_(None), table.c.id > last_id)
+            .order_by(table.c.id)
+            .limit(chunk_size)
+        ).all()
+        if not rows:
+            break
+        chunk = _typed_chunk(rows, ["id"] + COMMENT_COLUMNS)
+        last_id = int(chunk["id"].iloc[-1])
+        chunk["content_hash"] = content_hash(chunk)
+        comment_ids = dict(
+            session.execute(
+                select(comments.c.content_hash, comments.c.id).where(
+                    comments.c.content_hash.in_(set(chunk["content_hash"]))
+                )
+            ).all()
+        )
+        links = [
+            {"row_id": int(row_id), "linked_id": comment_ids[row_hash]}
+            for row_id, row_hash in zip(chunk["id"], chunk["content_hash"])
+            if row_hash in comment_ids
+        ]
+        if links:
+            session.execute(link, links)
+    session.execute(
+        text(
+            f"""
+            DELETE FROM {table.name}
+            WHERE comment_id IS NOT NULL AND id NOT IN (
+                SELECT MIN(id) FROM {table.name}
+                WHERE comment_id IS NOT NULL GROUP BY comment_id
+            )
+            """
+        )
+    )
+    session.execute(
+        text(
+            f"CREATE UNIQUE INDEX IF NOT EXISTS ix_{table.name}_comment_id "
+            f"ON {table.name} (comment_id)"
+        )
+    )
     session.commit()
-    print("Data successfully saved to database.")
 
 
-def get_all_sentiments(session):
+def iter_sentiments(session, columns=None, chunk_size=10000):
+    """Yield sentiment analysis results from the database in DataFrame chunks."""
+    columns = columns or SENTIMENT_COLUMNS
+    return iter_table(session, SentimentAnalysis.__table__, columns, chunk_size)
+
+
+def get_all_sentiments(session, columns=None):
     """Retrieve all sentiment analysis results from the database."""
-    query = session.query(SentimentAnalysis)
-    data = pd.DataFrame(
+    columns = columns or SENTIMENT_COLUMNS
+    return _concat_chunks(iter_sentiments(session, columns), columns)
+
+
+class DailySentiment(Base):
+    __tablename__ = "daily_sentiment"
+
+    stock = Column(String(50), primary_key=True)
+    date = Column(Date, primary_key=True)
+    positive_weighted = Column(Float, nullable=False)
+    negative_weighted = Column(Float, nullable=False)
+    total_posts = Column(Integer, nullable=False)
+    sentiment_score = Column(Float, nullable=False)
+
+
+def _stored_totals(session, table, where):
+    """Return the stored (stock, date) running totals matching where."""
+    query = select(
+        table.c.stock, table.c.date, *[table.c[column] for column in TOTAL_COLUMNS]
+    ).where(where)
+    return pd.DataFrame(
+        session.execute(query).all(), columns=["stock", "date"] + TOTAL_COLUMNS
+    )
+
+
+def update_daily_sentiment(session, totals, chunk_size=500, commit=True):
+    """Add per-(stock, date) totals of newly scored comments to 'daily_sentiment'.
+
+    The running sums are incremented with an upsert (on dialects without
+    one, the touched rows are read, summed, deleted and inserted again),
+    then the score is recomputed only for the stock-days that were touched.
+    With commit=False the changes are left in the session's open transaction.
+    """
+    if totals.empty:
+        return 0
+    table = DailySentiment.__table__
+    dialect = session.get_bind().dialect.name
+    totals = totals.assign(date=pd.to_datetime(totals["date"]).dt.date)
+    records = _to_records(totals.assign(sentiment_score=0.0), table.columns.keys())
+    insert = None
+    if dialect in ("postgresql", "sqlite"):
+        insert = (postgresql.insert if dialect == "postgresql" else sqlite.insert)(
+            table
+        )
+        insert = insert.on_conflict_do_update(
+            index_elements=["stock", "date"],
+            set_={
+                column: table.c[column] + insert.excluded[column]
+                for column in TOTAL_COLUMNS
+            },
+        )
+    update = (
+        table.update()
+        .where(
+            and_(
+                table.c.stock == bindparam("key_stock"),
+                table.c.date == bindparam("key_date"),
+            )
+        )
+        .values(sentiment_score=bindparam("new_score"))
+    )
+    keys = list(zip(totals["stock"], totals["date"]))
+    for start in range(0, len(records), chunk_size):
+        batch = records[start : start + chunk_size]
+        batch_keys = tuple_(table.c.stock, table.c.date).in_(
+            keys[start : start + chunk_size]
+        )
+        if insert is not None:
+            session.execute(insert, batch)
+        else:
+            merged = combine_totals(
+                [
+                    _stored_totals(session, table, batch_keys),
+                    pd.DataFrame(batch)[["stock", "date"] + TOTAL_COLUMNS],
+                ]
+            )
+            session.execute(table.delete().where(batch_keys))
+            session.execute(
+                table.insert(),
+                _to_records(
+                    merged.assign(sentiment_score=0.0), table.columns.keys()
+                ),
+            )
+        stored = _stored_totals(session, table, batch_keys)
+        session.execute(
+            update,
+            [
+                {"key_stock": stock, "key_date": date, "new_score": float(score)}
+                for stock, date, score in zip(
+                    stored["stock"], stored["date"], scores_from_totals(stored)
+                )
+            ],
+        )
+    if commit:
+        session.commit()
+    return len(records)
+
+
+def rebuild_daily_sentiment(session, chunk_size=10000):
+    """Recompute 'daily_sentiment' from scratch out of the full 'sentiment_score' table.
+
+    Used after a full rescoring run and to backfill the table once.
+    """
+    columns = ["stock", "comment_time", "influence", "sentiment"]
+    totals = combine_totals(
         [
-            {
-                "stock": row.stock,
-                "comment_time": row.comment_time,
-                "comments": row.comments,
-                "sentiment_tag": row.sentiment_tag,
-                "influence": row.influence,
-                "sentiment": row.sentiment,
-                "score": row.score,
-            }
-            for row in query
+            daily_sentiment_totals(chunk)
+            for chunk in iter_sentiments(session, columns, chunk_size)
         ]
     )
-    return data
+    session.execute(DailySentiment.__table__.delete())
+    update_daily_sentiment(session, totals, commit=False)
+    session.commit()
+
+
+def get_daily_sentiment(session, start_date=None):
+    """Retrieve daily sentiment scores (stock, date, sentiment_score) from the database."""
+    table = DailySentiment.__table__
+    query = select(table.c.stock, table.c.date, table.c.sentiment_score)
+    if start_date is not None:
+        query = query.where(table.c.date >= pd.Timestamp(start_date).date())
+    query = query.order_by(table.c.stock, table.c.date)
+    return pd.DataFrame(
+        session.execute(query).all(), columns=["stock", "date", "sentiment_score"]
+    )
@@ -0,0 +1,140 @@
+import datetime
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+class SymbolPageHandler(BaseHTTPRequestHandler):
+    """Serves fixtures/symbol.html for /symbol/<TICKER>, standing in for StockTwits.
+
+    Query parameters: page_size, max_messages and leading_body (0 or 1).
+    """
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        parts = url.path.strip("/").split("/")
+        if len(parts) != 2 or parts[0] != "symbol":
+            self.send_error(404)
+            return
+        query = parse_qs(url.query)
+        with open(os.path.join(FIXTURE_DIR, "symbol.html"), encoding="utf-8") as f:
+            page = (
+                f.read()
+                .replace("{{TICKER}}", parts[1])
+                .replace("{{PAGE_SIZE}}", query.get("page_size", ["20"])[0])
+                .replace("{{MAX_MESSAGES}}", query.get("max_messages", ["200"])[0])
+                .replace("{{LEADING_BODY}}", query.get("leading_body", ["0"])[0])
+            )
+        body = page.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StreamApiHandler(BaseHTTPRequestHandler):
+    """Serves a synthetic /api/2/streams/symbol/<TICKER>.json stream, standing in for the StockTwits API.
+
+    Message IDs count down from total_messages and message N is posted N
+    hours after 2024-10-01, so raising total_messages appends newer
+    messages; pages follow the max/since cursor rules of the real API. Every rate_limit_every-th request gets a
+    429 with Retry-After: 0, to exercise client retries.
+    """
+
+    total_messages = 200
+    page_size = 30
+    rate_limit_every = 0
+    request_count = 0
+    _lock = threading.Lock()
+
+    @classmethod
+    def configure(cls, **options):
+        """Returns a handler subclass with the given class attributes overridden."""
+        return type(cls.__name__, (cls,), {"request_count": 0, **options})
+
+    def _message(self, message_id):
+        created_at = datetime.datetime(2024, 10, 1) + datetime.timedelta(
+            hours=message_id
+        )
+        sentiment = ("Bullish", "Bearish", None)[message_id % 3]
+        return {
+            "id": message_id,
+            "body": f"fixture message {message_id}",
+            "created_at": created_at.strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "entities": {"sentiment": {"basic": sentiment} if sentiment else None},
+            "conversation": {"replies": message_id % 2},
+            "reshares": {"reshared_count": message_id % 3},
+            "likes": {"total": message_id % 5},
+        }
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        prefix = "/api/2/streams/symbol/"
+        if not url.path.startswith(prefix) or not url.path.endswith(".json"):
+            self.send_error(404)
+            return
+        with self._lock:
+            type(self).request_count += 1
+            request_count = type(self).request_count
+        if self.rate_limit_every and request_count % self.rate_limit_every == 0:
+            self.send_response(429)
+            self.send_header("Retry-After", "0")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        query = parse_qs(url.query)
+        max_id = int(query.get("max", [self.total_messages])[0])
+        since = int(query.get("since", [0])[0])
+        ids = [
+            message_id
+            for message_id in range(max_id, since, -1)
+            if 0 < message_id <= self.total_messages
+        ][: self.page_size]
+        payload = {
+            "symbol": {"symbol": url.path[len(prefix) : -len(".json")]},
+            "cursor": {
+                "more": bool(ids) and ids[-1] - 1 > since,
+                "since": ids[0] if ids else since,
+                "max": ids[-1] - 1 if ids else None,
+            },
+            "messages": [self._message(message_id) for message_id in ids],
+        }
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_api_fixture(port=0, **options):
+    """Starts a mock StockTwits API server; options override StreamApiHandler attributes.
+
+    Returns the server and the base URL to pass as api_url.
+    """
+    server, _ = serve_fixtures(port, StreamApiHandler.configure(**options))
+    host, port = server.server_address
+    return server, f"http://{host}:{port}/api/2/streams/symbol/"
+
+
+def serve_fixtures(port=0, handler=SymbolPageHandler):
+    """Starts a local fixture server on a background thread.
+
+    Returns the server and the base URL of its symbol pages; call
+    server.shutdown() when done.
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address
+    return server, f"http://{host}:{port}/symbol/"
@@ -0,0 +1,345 @@
+import multiprocessing
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from tqdm import tqdm
+from instrumentation import count, timed
+from scoring import ERROR_LABEL
+
+ERROR_RESULT = {"label": ERROR_LABEL, "score": 0.0}
+BACKENDS = ("auto", "torch", "quantized", "onnx")
+
+
+def detect_device():
+    """Returns the pipeline device index: 0 when a CUDA GPU is available, else -1 (CPU)."""
+    import torch
+
+    return 0 if torch.cuda.is_available() else -1
+
+
+def resolve_backend(backend="auto", device=None):
+    """Resolves 'auto' and the device into a concrete (backend, device) pair.
+
+    'auto' is the fp32 PyTorch model on whichever device is available; the
+    quantized and ONNX backends are never picked implicitly, since their
+    labels can differ. They always run on CPU.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(
+            f"Unknown inference backend {backend!r}, expected one of {BACKENDS}"
+        )
+    if device is None:
+        device = detect_device()
+    if backend == "auto":
+        backend = "torch"
+    if backend != "torch":
+        device = -1
+    return backend, device
+
+
+def model_revision(model_name):
+    """Returns the hub commit hash of the model's config, or '' if unknown."""
+    from transformers import AutoConfig
+
+    return getattr(AutoConfig.from_pretrained(model_name), "_commit_hash", None) or ""
+
+
+def _ort_model_class():
+    try:
+        from optimum.onnxruntime import ORTModelForSequenceClassification
+    except ImportError as e:
+        raise ImportError(
+            "The onnx backend requires optimum[onnxruntime] to be installed"
+        ) from e
+    return ORTModelForSequenceClassification
+
+
+def export_onnx(model_name, onnx_dir):
+    """Exports the model to ONNX in onnx_dir unless an export is already there.
+
+    The export is written to a temporary directory next to onnx_dir and
+    renamed into place, so concurrent exporters never see a partial model.
+    """
+    if os.path.isdir(onnx_dir):
+        return onnx_dir
+    model = _ort_model_class().from_pretrained(model_name, export=True)
+    temp_dir = f"{onnx_dir}.tmp-{os.getpid()}"
+    model.save_pretrained(temp_dir)
+    try:
+        os.replace(temp_dir, onnx_dir)
+    except OSError:
+        if not os.path.isdir(onnx_dir):
+            raise
+        shutil.rmtree(temp_dir, ignore_errors=True)
+    return onnx_dir
+
+
+def load_pipeline(
+    model_name, backend="auto", device=None, onnx_dir=None, num_threads=None
+):
+    """Builds a text-classification pipeline for the selected inference backend.
+
+    'torch' runs the fp32 model, 'quantized' applies dynamic int8 quantization
+    to its Linear layers and 'onnx' runs an ONNX Runtime session exported with
+    optimum (saved to and reloaded from onnx_dir when given). num_threads
+    limits the intra-op threads of the ONNX Runtime session; the PyTorch
+    backends follow torch.set_num_threads.
+    """
+    import torch
+    from transformers import AutoModelForSequenceClassification, AutoTokenizer
+    from transformers import pipeline
+
+    backend, device = resolve_backend(backend, device)
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    if backend == "onnx":
+        model_class = _ort_model_class()
+        session_options = None
+        if num_threads:
+            import onnxruntime
+
+            session_options = onnxruntime.SessionOptions()
+            session_options.intra_op_num_threads = num_threads
+            session_options.inter_op_num_threads = 1
+        if onnx_dir:
+            model = model_class.from_pretrained(
+                export_onnx(model_name, onnx_dir), session_options=session_options
+            )
+        else:
+            model = model_class.from_pretrained(
+                model_name, export=True, session_options=session_options
+            )
+    else:
+        model = AutoModelForSequenceClassification.from_pretrained(model_name)
+        model.eval()
+        if backend == "quantized":
+            model = torch.quantization.quantize_dynamic(
+                model, {torch.nn.Linear}, dtype=torch.qint8
+            )
+    return pipeline(
+        "text-classification",
+        model=model,
+        tokenizer=tokenizer,
+        device=device,
+        truncation=True,
+        padding=True,
+    )
+
+
+def token_lengths(tokenizer, texts):
+    """Returns the truncated token length of each text."""
+    encoded = tokenizer(list(texts), truncation=True)
+    return [len(ids) for ids in encoded["input_ids"]]
+
+
+def fixed_batches(n_texts, batch_size=16):
+    """Splits text positions into consecutive batches of batch_size."""
+    return [
+        list(range(start, min(start + batch_size, n_texts)))
+        for start in range(0, n_texts, batch_size)
+    ]
+
+
+def token_budget_batches(lengths, max_tokens=4096, max_batch_size=64):
+    """Groups text positions sorted by length into batches under a padded token budget.
+
+    A batch is padded to its longest text, so its cost is
+    len(batch) * max(length); batches are closed before that would exceed
+    max_tokens or hold more than max_batch_size texts.
+    """
+    order = sorted(range(len(lengths)), key=lengths.__getitem__)
+    batches = []
+    current = []
+    for index in order:
+        padded_tokens = lengths[index] * (len(current) + 1)
+        if current and (padded_tokens > max_tokens or len(current) >= max_batch_size):
+            batches.append(current)
+            current = []
+        current.append(index)
+    if current:
+        batches.append(current)
+    return batches
+
+
+@timed()
+def classify_comments(
+    pipe, comments, batch_size=16, max_tokens=None, raise_errors=False, progress=True
+):
+    """Runs the classifier over comments in batches and returns one result per comment.
+
+    With max_tokens, comments are bucketed by token length into batches under
+    that padded token budget (at most batch_size each); results are always
+    returned in the original order. A failed batch is filled with error
+    placeholders unless raise_errors is set.
+    """
+    if max_tokens is None:
+        batches = fixed_batches(len(comments), batch_size)
+    else:
+        lengths = token_lengths(pipe.tokenizer, comments)
+        batches = token_budget_batches(lengths, max_tokens, batch_size)
+    sentiment_results = [None] * len(comments)
+    for batch in tqdm(
+        batches, desc="Processing comments in batches", disable=not progress
+    ):
+        texts = [comments[i] for i in batch]
+        try:
+            results = pipe(texts, batch_size=len(texts))
+        except Exception as e:
+            if raise_errors:
+                raise
+            print(f"Error processing batch starting at comment {batch[0]}: {e}")
+            results = [ERROR_RESULT] * len(texts)
+        count("inference_batches")
+        count("comments_classified", len(texts))
+        for i, result in zip(batch, results):
+            sentiment_results[i] = result
+    return sentiment_results
+
+
+def classify_with_cache(classify, comments, cache):
+    """Classifies comments, sending only cache misses (deduplicated) to classify.
+
+    classify is any callable mapping a list of texts to a list of results.
+    """
+    sentiment_results = cache.get_many(comments)
+    misses = {}
+    for comment, result in zip(comments, sentiment_results):
+        if result is None:
+            misses.setdefault(cache.key(comment), comment)
+    miss_texts = list(misses.values())
+    count("cache_hits", sum(result is not None for result in sentiment_results))
+    count("cache_misses", sum(result is None for result in sentiment_results))
+    miss_results = classify(miss_texts) if miss_texts else []
+    valid = [
+        (text, result)
+        for text, result in zip(miss_texts, miss_results)
+        if result["label"] != ERROR_RESULT["label"]
+    ]
+    if valid:
+        cache.put_many([text for text, _ in valid], [result for _, result in valid])
+    by_key = {cache.key(text): result for text, result in zip(miss_texts, miss_results)}
+    return [
+        result if result is not None else by_key[cache.key(comment)]
+        for comment, result in zip(comments, sentiment_results)
+    ]
+
+
+_worker_pipe = None
+
+
+def _init_worker(model_name, backend, onnx_dir, num_threads):
+    """Pins the worker's intra-op threads and loads the model once per process."""
+    global _worker_pipe
+    import torch
+
+    torch.set_num_threads(num_threads)
+    _worker_pipe = load_pipeline(
+        model_name, backend, device=-1, onnx_dir=onnx_dir, num_threads=num_threads
+    )
+
+
+def _classify_shard(comments, batch_size, max_tokens):
+    """Classifies one shard in a worker, raising on failure so it can be retried."""
+    return classify_comments(
+        _worker_pipe,
+        comments,
+        batch_size,
+        max_tokens,
+        raise_errors=True,
+        progress=False,
+    )
+
+
+class ShardedClassifier:
+    """Classifies comments on CPU with a pool of worker processes.
+
+    Each worker loads the model once and gets an equal share of the cores.
+    The ONNX export is made once, here, before the workers start. Comments
+    are split into contiguous shards and the results merged back in order.
+    A failed shard is retried up to max_retries times, restarting the pool
+    if a worker died, and raises RuntimeError if it still fails.
+    """
+
+    def __init__(
+        self,
+        model_name,
+        n_workers=None,
+        backend="auto",
+        shard_size=512,
+        batch_size=64,
+        max_tokens=4096,
+        max_retries=2,
+        onnx_dir=None,
+    ):
+        cpu_count = os.cpu_count() or 1
+        self.n_workers = n_workers or cpu_count
+        self.num_threads = max(1, cpu_count // self.n_workers)
+        if onnx_dir and resolve_backend(backend, device=-1)[0] == "onnx":
+            export_onnx(model_name, onnx_dir)
+        self.initargs = (model_name, backend, onnx_dir, self.num_threads)
+        self.shard_size = shard_size
+        self.batch_size = batch_size
+        self.max_tokens = max_tokens
+        self.max_retries = max_retries
+        self.executor = None
+        self._start()
+
+    def _start(self):
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.n_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=self.initargs,
+        )
+
+    @timed("classify_sharded")
+    def __call__(self, comments):
+        count("comments_classified", len(comments))
+        shards = {
+            start: comments[start : start + self.shard_size]
+            for start in range(0, len(comments), self.shard_size)
+        }
+        results = [None] * len(comments)
+        attempts = dict.fromkeys(shards, 0)
+        pending = list(shards)
+        while pending:
+            futures = {
+                self.executor.submit(
+                    _classify_shard, shards[start], self.batch_size, self.max_tokens
+                ): start
+                for start in pending
+            }
+            pending = []
+            broken = False
+            for future in tqdm(
+                as_completed(futures), total=len(futures), desc="Classifying shards"
+            ):
+                start = futures[future]
+                try:
+                    shard_results = future.result()
+                except Exception as e:
+                    broken = broken or isinstance(e, BrokenProcessPool)
+                    attempts[start] += 1
+                    if attempts[start] > self.max_retries:
+                        raise RuntimeError(
+                            f"Shard starting at comment {start} failed "
+                            f"after {attempts[start]} attempts"
+                        ) from e
+                    print(f"Shard starting at comment {start} failed, retrying: {e}")
+                    pending.append(start)
+                    continue
+                results[start : start + len(shard_results)] = shard_results
+            if broken:
+                self.executor.shutdown(cancel_futures=True)
+                self._start()
+        return results
+
+    def close(self):
+        """Shuts down the worker processes."""
+        self.executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
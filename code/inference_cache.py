@@ -0,0 +1,149 @@
+import hashlib
+import os
+import re
+import sqlite3
+import time
+import unicodedata
+
+
+def normalize_text(text):
+    """Normalizes comment text for cache lookups (NFKC form, collapsed whitespace)."""
+    text = unicodedata.normalize("NFKC", str(text))
+    return re.sub(r"\s+", " ", text).strip()
+
+
+class InferenceCache:
+    """Persistent SQLite cache of classifier outputs.
+
+    Entries are keyed by a hash of the model name, model version and
+    normalized text. Once the cache holds more than max_entries, the least
+    recently used entries are evicted until evict_fraction of the capacity is
+    free again. The entry count is kept in memory, so the table is only
+    counted when the cache is opened.
+    """
+
+    def __init__(
+        self,
+        path,
+        model_name,
+        model_version="",
+        max_entries=1000000,
+        evict_fraction=0.1,
+    ):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.model_name = model_name
+        self.model_version = model_version or ""
+        self.max_entries = max_entries
+        self.evict_fraction = evict_fraction
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS predictions ("
+            "key TEXT PRIMARY KEY, label TEXT NOT NULL, "
+            "score REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS ix_predictions_last_used "
+            "ON predictions (last_used)"
+        )
+        self.connection.commit()
+        (self.entries,) = self.connection.execute(
+            "SELECT COUNT(*) FROM predictions"
+        ).fetchone()
+
+    def key(self, text):
+        """Returns the cache key of a comment for this model."""
+        content = "\x1f".join([self.model_name, self.model_version, normalize_text(text)])
+        return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+    def get_many(self, texts):
+        """Returns cached results aligned with texts, with None for misses."""
+        keys = [self.key(text) for text in texts]
+        unique_keys = list(set(keys))
+        found = {}
+        for start in range(0, len(unique_keys), 500):
+            part = unique_keys[start : start + 500]
+            placeholders = ", ".join("?" * len(part))
+            rows = self.connection.execute(
+                f"SELECT key, label, score FROM predictions WHERE key IN ({placeholders})",
+                part,
+            )
+            for key, label, score in rows:
+                found[key] = {"label": label, "score": score}
+        if found:
+            now = time.time()
+            self.connection.executemany(
+                "UPDATE predictions SET last_used = ? WHERE key = ?",
+                [(now, key) for key in found],
+            )
+            self.connection.commit()
+        results = [found.get(key) for key in keys]
+        hits = sum(result is not None for result in results)
+        self.hits += hits
+        self.misses += len(results) - hits
+        return results
+
+    def _count_existing(self, keys):
+        """Returns how many of keys are already stored."""
+        existing = 0
+        for start in range(0, len(keys), 500):
+            part = keys[start : start + 500]
+            placeholders = ", ".join("?" * len(part))
+            (found,) = self.connection.execute(
+                f"SELECT COUNT(*) FROM predictions WHERE key IN ({placeholders})",
+                part,
+            ).fetchone()
+            existing += found
+        return existing
+
+    def put_many(self, texts, results):
+        """Stores classifier results for texts and evicts old entries if needed."""
+        now = time.time()
+        rows = {
+            self.key(text): (result["label"], float(result["score"]))
+            for text, result in zip(texts, results)
+        }
+        added = len(rows) - self._count_existing(list(rows))
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO predictions (key, label, score, last_used) "
+            "VALUES (?, ?, ?, ?)",
+            [(key, label, score, now) for key, (label, score) in rows.items()],
+        )
+        self.connection.commit()
+        self.entries += added
+        if self.entries > self.max_entries:
+            self.evict()
+
+    def evict(self):
+        """Deletes the least recently used entries until evict_fraction of max_entries is free."""
+        target = int(self.max_entries * (1 - self.evict_fraction))
+        excess = self.entries - target
+        if excess > 0:
+            deleted = self.connection.execute(
+                "DELETE FROM predictions WHERE key IN ("
+                "SELECT key FROM predictions ORDER BY last_used LIMIT ?)",
+                (excess,),
+            ).rowcount
+            self.connection.commit()
+            self.entries -= deleted
+            self.evictions += deleted
+
+    def stats(self):
+        """Returns lookup and size statistics for the cache."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": self.entries,
+            "evictions": self.evictions,
+        }
+
+    def close(self):
+        """Closes the underlying database connection."""
+        self.connection.close()
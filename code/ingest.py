@@ -0,0 +1,240 @@
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+from datastorage import bulk_save_to_database
+from waits import LatencyHistogram
+
+
+def write_csv(data, company, path):
+    """
+    Saves extracted data to a CSV file for a given company, appending to the file if it already exists.
+    """
+    file_path = os.path.join(path, f"{company}.csv")
+    write_header = not os.path.exists(file_path)
+    data.to_csv(file_path, mode="a+", index=False, header=write_header, sep=",")
+
+
+class IngestStoppedError(RuntimeError):
+    """Raised for pages submitted after the ingest writer has died."""
+
+
+class IngestService:
+    """Decouples scraping from storage with an asyncio producer/consumer queue.
+
+    Scraper threads submit pages of rows; a writer task on a background
+    event loop batches them until batch_rows rows are waiting or
+    flush_interval seconds have passed since the first one arrived, then
+    writes the batch with one bulk database insert and one CSV append per
+    stock. The queue holds at most max_pending pages, so submit blocks the
+    scraper while the writer is behind. Database work runs on a single
+    thread that owns the service's session. Each page is tracked per stock,
+    so flush(stock) waits only for that stock's pages and reports whether
+    they were all written. If the writer task dies, pending and later
+    pages fail instead of waiting forever.
+    """
+
+    def __init__(
+        self,
+        session_factory,
+        csv_path,
+        max_pending=100,
+        batch_rows=2000,
+        flush_interval=2.0,
+    ):
+        self.session_factory = session_factory
+        self.csv_path = csv_path
+        self.max_pending = max_pending
+        self.batch_rows = batch_rows
+        self.flush_interval = flush_interval
+        self.latency = LatencyHistogram()
+        self.counters = {
+            "pages": 0,
+            "rows_submitted": 0,
+            "rows_written": 0,
+            "batches": 0,
+            "write_errors": 0,
+            "max_queue_depth": 0,
+            "queue_depth_total": 0,
+        }
+        self._session = None
+        self._loop = None
+        self._thread = None
+        self._queue = None
+        self._writer_task = None
+        self._executor = None
+        self._pending = {}
+
+    def start(self):
+        """Starts the event loop thread and the writer task."""
+        os.makedirs(self.csv_path, exist_ok=True)
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+        self._thread.start()
+        self._call(self._setup())
+        return self
+
+    def _call(self, coroutine):
+        """Runs a coroutine on the service loop and waits for its result."""
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    async def _setup(self):
+        self._queue = asyncio.Queue(maxsize=self.max_pending)
+        self._writer_task = asyncio.ensure_future(self._writer())
+
+    def _fail_pending(self, error):
+        """Fails every page not yet written, including those still queued."""
+        while not self._queue.empty():
+            self._queue.get_nowait()
+            self._queue.task_done()
+        for futures in self._pending.values():
+            for future in futures:
+                if not future.done():
+                    future.set_exception(error)
+
+    async def _put(self, page):
+        if self._writer_task.done():
+            raise IngestStoppedError("The ingest writer has stopped")
+        written = asyncio.get_running_loop().create_future()
+        for stock in page["stock"].unique():
+            self._pending.setdefault(stock, []).append(written)
+        await self._queue.put((page, written))
+        if self._writer_task.done():
+            self._fail_pending(IngestStoppedError("The ingest writer has stopped"))
+        depth = self._queue.qsize()
+        self.counters["pages"] += 1
+        self.counters["rows_submitted"] += len(page)
+        self.counters["queue_depth_total"] += depth
+        self.counters["max_queue_depth"] = max(self.counters["max_queue_depth"], depth)
+
+    def submit(self, page):
+        """Queues a DataFrame of rows for writing, blocking while the queue is full."""
+        if page.empty:
+            return
+        with self.latency.time("submit_wait"):
+            self._call(self._put(page))
+
+    async def _wait_written(self, stock):
+        stocks = list(self._pending) if stock is None else [stock]
+        futures = [future for name in stocks for future in self._pending.get(name, [])]
+        results = await asyncio.gather(*futures, return_exceptions=True)
+        for name in stocks:
+            remaining = [f for f in self._pending.get(name, []) if not f.done()]
+            if remaining:
+                self._pending[name] = remaining
+            else:
+                self._pending.pop(name, None)
+        return all(result is True for result in results)
+
+    def flush(self, stock=None):
+        """Blocks until the pages submitted so far for stock (all stocks by default) are written.
+
+        Returns True only if all of them were saved to both the database and CSV.
+        """
+        return self._call(self._wait_written(stock))
+
+    async def _writer(self):
+        try:
+            await self._write_pages()
+        except BaseException as e:
+            print(f"Ingest writer stopped: {e!r}")
+            self._fail_pending(
+                IngestStoppedError(f"The ingest writer has stopped: {e!r}")
+            )
+            raise
+
+    async def _write_pages(self):
+        loop = asyncio.get_running_loop()
+        closing = False
+        while not closing:
+            item = await self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                break
+            batch, rows = [item], len(item[0])
+            deadline = loop.time() + self.flush_interval
+            while rows < self.batch_rows:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    self._queue.task_done()
+                    closing = True
+                    break
+                batch.append(item)
+                rows += len(item[0])
+            data = pd.concat([page for page, _ in batch], ignore_index=True)
+            saved = await loop.run_in_executor(self._executor, self._write_batch, data)
+            for _, written in batch:
+                if not written.done():
+                    written.set_result(saved)
+                self._queue.task_done()
+
+    async def _drain(self):
+        if not self._writer_task.done():
+            await self._queue.put(None)
+        try:
+            await self._writer_task
+        except Exception:
+            pass
+
+    def _write_batch(self, data):
+        """Writes one batch to the database and the per-stock CSV files, returning whether both succeeded."""
+        saved = True
+        if self._session is None:
+            self._session = self.session_factory()
+        try:
+            with self.latency.time("db_write"):
+                bulk_save_to_database(data, self._session)
+        except Exception as e:
+            saved = False
+            self.counters["write_errors"] += 1
+            print(f"Error saving batch of {len(data)} rows to database: {e}")
+            self._session.rollback()
+        try:
+            with self.latency.time("csv_write"):
+                for stock, rows in data.groupby("stock", sort=False):
+                    write_csv(rows, stock, self.csv_path)
+        except Exception as e:
+            saved = False
+            self.counters["write_errors"] += 1
+            print(f"Error writing batch of {len(data)} rows to CSV: {e}")
+        self.counters["rows_written"] += len(data)
+        self.counters["batches"] += 1
+        return saved
+
+    def metrics(self):
+        """Returns the counters, with mean queue depth, and the write latency summary."""
+        counters = dict(self.counters)
+        counters["mean_queue_depth"] = counters.pop("queue_depth_total") / max(
+            counters["pages"], 1
+        )
+        return counters, self.latency.summary()
+
+    def close(self):
+        """Writes everything still queued, then stops the writer and the loop."""
+        if self._loop is None:
+            return
+        start_time = time.perf_counter()
+        self._call(self._drain())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+        self._loop = None
+        if self._session is not None:
+            self._executor.submit(self._session.close).result()
+        self._executor.shutdown()
+        self.latency.record("shutdown_flush", time.perf_counter() - start_time)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.close()
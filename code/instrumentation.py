@@ -0,0 +1,215 @@
+import cProfile
+import datetime
+import functools
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+PROFILE_DIR_ENV = "PROFILE_DIR"
+REPORT_PATH = "data/run_reports.jsonl"
+
+
+def current_rss_mb():
+    """Returns the resident set size of this process in MB.
+
+    Uses psutil when installed, /proc/self/statm on Linux, and the peak RSS
+    from getrusage as a last resort.
+    """
+    try:
+        import psutil
+
+        return psutil.Process().memory_info().rss / 2**20
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError):
+        pass
+    return peak_rss_mb() if resource is not None else 0.0
+
+
+def peak_rss_mb():
+    """Returns the peak resident set size of this process in MB."""
+    if resource is None:
+        return current_rss_mb()
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+
+class RunMetrics:
+    """Stage timings, counters and peak memory for one run of an entry point.
+
+    stage() times a block and attributes counters recorded inside it to
+    that stage, so the report can give rates such as comments/sec. While
+    any stage is open a sampler thread polls the RSS every sample_interval
+    seconds and keeps the peak seen by each stage. When profile_dir is set
+    (or the PROFILE_DIR environment variable), a stage entered while no
+    other stage is being profiled runs under cProfile and is dumped as
+    <stage>-<pid>-<n>.prof for pstats or snakeviz.
+    """
+
+    def __init__(self, name=None, profile_dir=None, sample_interval=0.1):
+        self.name = name or os.path.splitext(os.path.basename(sys.argv[0]))[0]
+        self.run_id = uuid.uuid4().hex
+        self.started_at = datetime.datetime.now(datetime.timezone.utc)
+        self.start_time = time.perf_counter()
+        self.profile_dir = profile_dir or os.getenv(PROFILE_DIR_ENV)
+        self.sample_interval = sample_interval
+        self.stages = {}
+        self.counters = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._open_stages = {}
+        self._sampler = None
+        self._profiling = False
+        self._profile_count = 0
+
+    def _stage_entry(self, name):
+        return self.stages.setdefault(
+            name,
+            {"calls": 0, "total_seconds": 0.0, "max_seconds": 0.0, "peak_rss_mb": 0.0},
+        )
+
+    def _sample(self):
+        while True:
+            with self._lock:
+                if not self._open_stages:
+                    self._sampler = None
+                    return
+                rss = current_rss_mb()
+                for name in self._open_stages:
+                    entry = self._stage_entry(name)
+                    entry["peak_rss_mb"] = max(entry["peak_rss_mb"], rss)
+            time.sleep(self.sample_interval)
+
+    @contextmanager
+    def stage(self, name, profile=True):
+        """Times the with-block as stage name, sampling memory and optionally profiling it."""
+        profiler = None
+        with self._lock:
+            if profile and self.profile_dir and not self._profiling:
+                self._profiling = True
+                profiler = cProfile.Profile()
+            self._open_stages[name] = self._open_stages.get(name, 0) + 1
+            entry = self._stage_entry(name)
+            entry["peak_rss_mb"] = max(entry["peak_rss_mb"], current_rss_mb())
+            if self._sampler is None:
+                self._sampler = threading.Thread(target=self._sample, daemon=True)
+                self._sampler.start()
+        self._local.current = getattr(self._local, "current", []) + [name]
+        start_time = time.perf_counter()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            yield
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            elapsed = time.perf_counter() - start_time
+            self._local.current = self._local.current[:-1]
+            with self._lock:
+                self._open_stages[name] -= 1
+                if not self._open_stages[name]:
+                    del self._open_stages[name]
+                entry = self._stage_entry(name)
+                entry["calls"] += 1
+                entry["total_seconds"] += elapsed
+                entry["max_seconds"] = max(entry["max_seconds"], elapsed)
+                if profiler is not None:
+                    self._profiling = False
+                    self._profile_count += 1
+                profile_number = self._profile_count
+            if profiler is not None:
+                os.makedirs(self.profile_dir, exist_ok=True)
+                profiler.dump_stats(
+                    os.path.join(
+                        self.profile_dir,
+                        f"{name}-{os.getpid()}-{profile_number}.prof",
+                    )
+                )
+
+    def count(self, name, value=1):
+        """Adds value to counter name, also attributing it to the innermost open stage."""
+        current = getattr(self._local, "current", [])
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+            if current:
+                stage_counters = self._stage_entry(current[-1]).setdefault(
+                    "counters", {}
+                )
+                stage_counters[name] = stage_counters.get(name, 0) + value
+
+    def summary(self):
+        """Returns the run as a JSON-serializable dict, with per-stage counter rates."""
+        with self._lock:
+            stages = {}
+            for name, entry in self.stages.items():
+                entry = dict(entry, counters=dict(entry.get("counters", {})))
+                for counter, value in entry.get("counters", {}).items():
+                    if entry["total_seconds"] > 0:
+                        entry[f"{counter}_per_sec"] = value / entry["total_seconds"]
+                stages[name] = entry
+            return {
+                "run_id": self.run_id,
+                "name": self.name,
+                "started_at": self.started_at.isoformat(),
+                "duration_seconds": time.perf_counter() - self.start_time,
+                "peak_rss_mb": peak_rss_mb(),
+                "counters": dict(self.counters),
+                "stages": stages,
+            }
+
+    def write_report(self, path=REPORT_PATH, **extra):
+        """Appends the run summary, plus any extra fields, as one JSON line to path."""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        record = {**self.summary(), **extra}
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, default=str) + "\n")
+        return record
+
+
+RUN = RunMetrics()
+
+
+def stage(name, profile=True):
+    """Times a with-block as a stage of the current run."""
+    return RUN.stage(name, profile)
+
+
+def timed(name=None, profile=True):
+    """Decorator that records every call of the function as a stage (the function name by default)."""
+
+    def decorator(func):
+        stage_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with RUN.stage(stage_name, profile):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def count(name, value=1):
+    """Adds value to a counter of the current run."""
+    RUN.count(name, value)
+
+
+def write_report(path=REPORT_PATH, **extra):
+    """Appends the current run's summary to the JSON-lines run report."""
+    return RUN.write_report(path, **extra)
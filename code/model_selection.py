@@ -0,0 +1,287 @@
+import hashlib
+import itertools
+import json
+import os
+import warnings
+import numpy as np
+import pandas as pd
+from statsmodels.tsa.arima.model import ARIMA
+from statsmodels.tsa.api import VAR
+from statsmodels.tsa.stattools import adfuller
+from instrumentation import count, timed
+from parallel import model_fit_pool
+from pipeline_runner import fingerprint
+
+SELECTION_CACHE_DIR = "data/.cache/model_selection"
+CRITERIA = ("aic", "bic")
+
+_design = {}
+
+
+def _install_design(endog, exog):
+    """Pool initializer: keeps the prepared design in each worker for all its fits."""
+    _design["endog"] = endog
+    _design["exog"] = exog
+
+
+def _fit_summary(result, converged=True):
+    return {
+        "aic": float(result.aic),
+        "bic": float(result.bic),
+        "llf": float(result.llf),
+        "nobs": int(result.nobs),
+        "converged": bool(converged),
+    }
+
+
+def _fit_arima_order(order, start_params):
+    """Fits one ARIMA order on the installed design, warm-started from start_params.
+
+    start_params maps parameter names (e.g. 'ar.L1', 'sigma2') to values from
+    a neighbouring order; names the neighbour lacks keep statsmodels' defaults.
+    """
+    model = ARIMA(_design["endog"], exog=_design["exog"], order=order)
+    params = None
+    if start_params:
+        defaults = dict(zip(model.param_names, model.start_params))
+        params = np.array(
+            [start_params.get(name, defaults[name]) for name in model.param_names]
+        )
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        result = model.fit(start_params=params)
+    converged = (result.mle_retvals or {}).get("converged", True)
+    summary = _fit_summary(result, converged)
+    summary["params"] = dict(zip(model.param_names, map(float, result.params)))
+    return summary
+
+
+def _fit_var_lags(lags, max_lags):
+    """Fits a VAR with lags on the sample shared by every lag length up to max_lags."""
+    result = VAR(_design["endog"][max_lags - lags :]).fit(lags)
+    return _fit_summary(result)
+
+
+class SelectionCache:
+    """Fit summaries stored as one JSON file per (data fingerprint, specification)."""
+
+    def __init__(self, cache_dir=SELECTION_CACHE_DIR):
+        self.cache_dir = cache_dir
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def key(self, data_hash, spec):
+        content = f"{data_hash}|{json.dumps(spec, sort_keys=True)}"
+        return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        if not self.cache_dir or not os.path.exists(self._path(key)):
+            return None
+        with open(self._path(key), encoding="utf-8") as f:
+            return json.load(f)
+
+    def put(self, key, summary):
+        if not self.cache_dir:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        temp_path = self._path(key) + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(summary, f)
+        os.replace(temp_path, self._path(key))
+
+
+def rank_fits(rows, criterion="aic"):
+    """Returns fit rows as a DataFrame sorted by criterion, with a rank per criterion."""
+    if criterion not in CRITERIA:
+        raise ValueError(
+            f"Unknown criterion {criterion!r}, expected one of {CRITERIA}"
+        )
+    table = pd.DataFrame(rows)
+    for name in CRITERIA:
+        table[f"rank_{name}"] = table[name].rank(method="min").astype("Int64")
+    return table.sort_values([criterion, "spec"], kind="stable").reset_index(drop=True)
+
+
+def _arima_row(order, summary, cached):
+    p, d, q = order
+    return {
+        "spec": f"ARIMA{order}",
+        "p": p,
+        "d": d,
+        "q": q,
+        **summary,
+        "cached": cached,
+    }
+
+
+def select_differencing(endog, max_d=1, alpha=0.05):
+    """Returns the smallest d up to max_d whose differenced series rejects a unit root.
+
+    Runs an augmented Dickey-Fuller test on the series differenced 0, 1, ...
+    times and stops at the first p-value below alpha; if none is, max_d is
+    used. Returns d together with the p-value of the test at that d.
+    """
+    series = pd.Series(endog).reset_index(drop=True).astype("float64")
+    for d in range(max_d + 1):
+        pvalue = float(adfuller(series.dropna())[1])
+        if pvalue < alpha or d == max_d:
+            return d, pvalue
+        series = series.diff()
+
+
+def _neighbour_params(order, fitted):
+    """Returns the fitted parameters of the closest smaller order, if any."""
+    p, d, q = order
+    for neighbour in ((p, d, q - 1), (p - 1, d, q), (p - 1, d, q - 1)):
+        if neighbour in fitted:
+            return fitted[neighbour]
+    return None
+
+
+@timed()
+def select_arima_order(
+    endog,
+    exog=None,
+    p_values=range(0, 4),
+    d=None,
+    q_values=range(0, 4),
+    criterion="aic",
+    n_workers=None,
+    cache_dir=SELECTION_CACHE_DIR,
+    max_d=1,
+):
+    """Fits a grid of ARIMA (p, q) orders in parallel and ranks them by AIC/BIC.
+
+    d is fixed for the whole grid, since fits on differently differenced
+    series are not comparable: the given d, or else the one chosen by
+    select_differencing up to max_d (its ADF p-value goes in adf_pvalue).
+    The design is installed once per pool worker, so tasks only carry the
+    order. Orders are fitted in waves of increasing p + q, each warm-started
+    from a fitted neighbour one term smaller. Summaries are cached by data
+    fingerprint and order. Orders that fail to fit are reported and left
+    out of the table.
+    """
+    endog = pd.Series(endog).reset_index(drop=True).astype("float64")
+    if exog is not None:
+        exog = pd.DataFrame(exog).reset_index(drop=True).astype("float64")
+    design = endog.to_frame("endog")
+    if exog is not None:
+        design = design.join(exog)
+    data_hash = fingerprint(design)
+    cache = SelectionCache(cache_dir)
+    adf_pvalue = np.nan
+    if d is None:
+        d, adf_pvalue = select_differencing(endog, max_d)
+    orders = list(itertools.product(p_values, [d], q_values))
+    waves = {}
+    for order in orders:
+        waves.setdefault(order[0] + order[2], []).append(order)
+    fitted = {}
+    rows = []
+    design = (endog.to_numpy(), None if exog is None else exog.to_numpy())
+    with model_fit_pool(n_workers, _install_design, design) as executor:
+        for size in sorted(waves):
+            pending = {}
+            for order in waves[size]:
+                spec = {"model": "arima", "order": list(order)}
+                key = cache.key(data_hash, spec)
+                summary = cache.get(key)
+                if summary is not None:
+                    count("selection_cache_hits")
+                    fitted[order] = summary["params"]
+                    rows.append(_arima_row(order, summary, cached=True))
+                    continue
+                future = executor.submit(
+                    _fit_arima_order, order, _neighbour_params(order, fitted)
+                )
+                pending[future] = (order, key)
+            for future, (order, key) in pending.items():
+                try:
+                    summary = future.result()
+                except Exception as e:
+                    print(f"ARIMA{order} failed: {e}")
+                    continue
+                cache.put(key, summary)
+                fitted[order] = summary["params"]
+                rows.append(_arima_row(order, summary, cached=False))
+    if not rows:
+        return pd.DataFrame()
+    table = rank_fits(rows, criterion)
+    table.insert(0, "model", "arima")
+    table["adf_pvalue"] = adf_pvalue
+    return table.drop(columns=["params"])
+
+
+@timed()
+def select_var_lags(
+    data, max_lags=8, criterion="aic", n_workers=None, cache_dir=SELECTION_CACHE_DIR
+):
+    """Fits VAR(1) to VAR(max_lags) in parallel and ranks the lag lengths by AIC/BIC.
+
+    Every lag length is estimated on the same sample (the first max_lags
+    rows are held out for all of them), so the criteria are comparable.
+    Summaries are cached by data fingerprint and lag length.
+    """
+    data = pd.DataFrame(data).reset_index(drop=True).astype("float64")
+    data_hash = fingerprint(data)
+    cache = SelectionCache(cache_dir)
+    rows = []
+    pending = {}
+    design = (data.to_numpy(), None)
+    with model_fit_pool(n_workers, _install_design, design) as executor:
+        for lags in range(1, max_lags + 1):
+            spec = {"model": "var", "lags": lags, "max_lags": max_lags}
+            key = cache.key(data_hash, spec)
+            summary = cache.get(key)
+            if summary is not None:
+                count("selection_cache_hits")
+                rows.append(
+                    {"spec": f"VAR({lags})", "lags": lags, **summary, "cached": True}
+                )
+                continue
+            pending[executor.submit(_fit_var_lags, lags, max_lags)] = (lags, key)
+        for future, (lags, key) in pending.items():
+            try:
+                summary = future.result()
+            except Exception as e:
+                print(f"VAR({lags}) failed: {e}")
+                continue
+            cache.put(key, summary)
+            rows.append(
+                {"spec": f"VAR({lags})", "lags": lags, **summary, "cached": False}
+            )
+    if not rows:
+        return pd.DataFrame()
+    table = rank_fits(rows, criterion)
+    table.insert(0, "model", "var")
+    return table
+
+
+def _fallback(default, kind):
+    """Returns default for an empty selection table, warning that nothing was fitted."""
+    if default is None:
+        raise ValueError(f"No {kind} could be fitted and no default was given")
+    print(f"Warning: no {kind} could be fitted, falling back to {default}")
+    return default
+
+
+def best_order(table, default=None):
+    """Returns the (p, d, q) order ranked first in a select_arima_order table.
+
+    If every order failed to fit and the table is empty, default is returned.
+    """
+    if table.empty:
+        return _fallback(default, "ARIMA order")
+    best = table.iloc[0]
+    return int(best["p"]), int(best["d"]), int(best["q"])
+
+
+def best_lags(table, default=None):
+    """Returns the lag length ranked first in a select_var_lags table.
+
+    If every lag length failed to fit and the table is empty, default is returned.
+    """
+    if table.empty:
+        return _fallback(default, "VAR lag length")
+    return int(table["lags"].iloc[0])
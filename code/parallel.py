@@ -0,0 +1,59 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+BLAS_THREAD_VARIABLES = (
+    "OMP_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+    "MKL_NUM_THREADS",
+    "VECLIB_MAXIMUM_THREADS",
+    "NUMEXPR_NUM_THREADS",
+)
+
+
+@contextmanager
+def single_threaded_blas():
+    """Sets the BLAS/OpenMP thread variables to 1 so spawned workers start single-threaded."""
+    saved = {name: os.environ.get(name) for name in BLAS_THREAD_VARIABLES}
+    os.environ.update({name: "1" for name in BLAS_THREAD_VARIABLES})
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+def limit_blas_threads():
+    """Limits already-loaded BLAS pools to one thread when threadpoolctl is installed."""
+    try:
+        from threadpoolctl import threadpool_limits
+    except ImportError:
+        return
+    threadpool_limits(1)
+
+
+def _init_worker(initializer, initargs):
+    limit_blas_threads()
+    if initializer is not None:
+        initializer(*initargs)
+
+
+@contextmanager
+def model_fit_pool(n_workers=None, initializer=None, initargs=()):
+    """A spawn-based process pool for model fitting whose workers run BLAS single-threaded.
+
+    One fit per task keeps every core busy, so BLAS threads inside each
+    worker would only oversubscribe the CPU. initializer(*initargs) runs
+    once per worker, e.g. to install data shared by all tasks.
+    """
+    with single_threaded_blas(), ProcessPoolExecutor(
+        max_workers=n_workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(initializer, initargs),
+    ) as executor:
+        yield executor
@@ -0,0 +1,214 @@
+import hashlib
+import json
+import os
+import re
+import types
+import pandas as pd
+from storage import write_table
+from instrumentation import stage as instrument_stage
+
+
+def fingerprint(value):
+    """Returns a content hash of a DataFrame, or of a dict of DataFrames."""
+    digest = hashlib.sha1()
+    if isinstance(value, dict):
+        for key in sorted(value):
+            digest.update(str(key).encode("utf-8"))
+            digest.update(fingerprint(value[key]).encode("utf-8"))
+        return digest.hexdigest()
+    digest.update(str(list(value.columns)).encode("utf-8"))
+    digest.update(str(list(value.dtypes.astype(str))).encode("utf-8"))
+    digest.update(pd.util.hash_pandas_object(value, index=True).values.tobytes())
+    return digest.hexdigest()
+
+
+_CONSTANT_TYPES = (str, bytes, int, float, bool, tuple, list, dict, type(None))
+
+
+def _stable_repr(value):
+    """repr() that does not depend on set ordering, which varies between runs."""
+    if isinstance(value, (set, frozenset)):
+        return "{" + ", ".join(sorted(_stable_repr(item) for item in value)) + "}"
+    if isinstance(value, tuple):
+        return "(" + ", ".join(_stable_repr(item) for item in value) + ")"
+    return repr(value)
+
+
+def _code_hash(func):
+    """Hashes a stage function's code so editing it invalidates the cache.
+
+    Covers the bytecode, constants and names of the function and its nested
+    code, the code of module-level functions it calls that are defined next
+    to it (recursively, including through decorators), and the values of
+    the module-level constants they read, such as a date cut-off.
+    """
+    func = getattr(func, "__wrapped__", func)
+    digest = hashlib.sha1(getattr(func, "__qualname__", repr(func)).encode("utf-8"))
+    code = getattr(func, "__code__", None)
+    if code is None:
+        return digest.hexdigest()
+    root = os.path.dirname(os.path.abspath(code.co_filename))
+    seen = set()
+
+    def visit(code, namespace):
+        if code in seen:
+            return
+        seen.add(code)
+        digest.update(code.co_code)
+        digest.update(repr(code.co_names).encode("utf-8"))
+        for const in code.co_consts:
+            if isinstance(const, types.CodeType):
+                visit(const, namespace)
+            else:
+                digest.update(_stable_repr(const).encode("utf-8"))
+        for name in code.co_names:
+            value = namespace.get(name)
+            value = getattr(value, "__wrapped__", value)
+            if isinstance(value, types.FunctionType):
+                path = os.path.abspath(value.__code__.co_filename)
+                if os.path.dirname(path) == root:
+                    visit(value.__code__, value.__globals__)
+            elif isinstance(value, _CONSTANT_TYPES):
+                digest.update(f"{name}={_stable_repr(value)}".encode("utf-8"))
+
+    visit(code, func.__globals__)
+    return digest.hexdigest()
+
+
+class Stage:
+    """A pipeline step: func is called with the outputs of inputs and returns a DataFrame."""
+
+    def __init__(self, name, func, inputs, sink=None, partition_cols=None):
+        self.name = name
+        self.func = func
+        self.inputs = list(inputs)
+        self.sink = sink
+        self.partition_cols = partition_cols
+
+
+class Pipeline:
+    """Runs DataFrame stages in dependency order, keeping intermediates in memory.
+
+    A stage's key hashes its code and the keys of its inputs (source keys are
+    content hashes). When cache_dir holds an output for that key the stage is
+    skipped and the cached output is loaded only if a later stage needs it.
+    Sinks are optional files, rewritten whenever they are missing or were last
+    written for a different key, so they always match the current inputs.
+    Cached outputs of earlier keys are deleted at the end of each run.
+    """
+
+    def __init__(self, cache_dir=None):
+        self.cache_dir = cache_dir
+        self.stages = {}
+
+    def add(self, name, func, inputs=(), sink=None, partition_cols=None):
+        """Adds a stage and returns the pipeline so calls can be chained."""
+        self.stages[name] = Stage(name, func, inputs, sink, partition_cols)
+        return self
+
+    def _order(self, sources):
+        """Returns stage names in dependency order, raising on unknown inputs or cycles."""
+        order, done, visiting = [], set(sources), set()
+
+        def visit(name):
+            if name in done:
+                return
+            if name not in self.stages:
+                raise KeyError(f"Unknown pipeline input: {name}")
+            if name in visiting:
+                raise ValueError(f"Pipeline cycle through stage: {name}")
+            visiting.add(name)
+            for input_name in self.stages[name].inputs:
+                visit(input_name)
+            visiting.discard(name)
+            done.add(name)
+            order.append(name)
+
+        for name in self.stages:
+            visit(name)
+        return order
+
+    def _cache_path(self, name, key):
+        return os.path.join(self.cache_dir, f"{name}-{key}.parquet")
+
+    def _sink_keys_path(self):
+        return os.path.join(self.cache_dir, "sink_keys.json")
+
+    def _load_sink_keys(self):
+        """Returns the stage key each sink was last written for."""
+        if not self.cache_dir or not os.path.exists(self._sink_keys_path()):
+            return {}
+        with open(self._sink_keys_path(), encoding="utf-8") as f:
+            return json.load(f)
+
+    def _save_sink_keys(self, sink_keys):
+        if not self.cache_dir:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        temp_path = self._sink_keys_path() + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(sink_keys, f, indent=2, sort_keys=True)
+        os.replace(temp_path, self._sink_keys_path())
+
+    def _prune_cache(self, keys):
+        """Deletes cached stage outputs whose key is not the stage's current one."""
+        if not self.cache_dir or not os.path.isdir(self.cache_dir):
+            return
+        patterns = {
+            name: re.compile(rf"{re.escape(name)}-([0-9a-f]{{40}})\.parquet")
+            for name in self.stages
+            if name in keys
+        }
+        for file_name in os.listdir(self.cache_dir):
+            for name, pattern in patterns.items():
+                match = pattern.fullmatch(file_name)
+                if match and match.group(1) != keys[name]:
+                    os.remove(os.path.join(self.cache_dir, file_name))
+                    break
+
+    def run(self, sources, outputs=()):
+        """Runs the pipeline on a dict of source DataFrames.
+
+        Returns the outputs named in outputs, loading them from the cache if
+        their stage was skipped.
+        """
+        keys = {name: fingerprint(value) for name, value in sources.items()}
+        values = dict(sources)
+        cached = {}
+        sink_keys = self._load_sink_keys()
+
+        def write_sink(stage, key):
+            write_table(load(stage.name), stage.sink, stage.partition_cols)
+            sink_keys[os.path.abspath(stage.sink)] = key
+            self._save_sink_keys(sink_keys)
+
+        def load(name):
+            if name not in values:
+                values[name] = pd.read_parquet(cached[name])
+            return values[name]
+
+        for name in self._order(sources):
+            stage = self.stages[name]
+            key_parts = [_code_hash(stage.func)] + [keys[i] for i in stage.inputs]
+            keys[name] = hashlib.sha1("|".join(key_parts).encode("utf-8")).hexdigest()
+            cache_path = self._cache_path(name, keys[name]) if self.cache_dir else None
+            if cache_path and os.path.exists(cache_path):
+                print(f"Stage {name}: inputs unchanged, skipped")
+                cached[name] = cache_path
+                if stage.sink and (
+                    not os.path.exists(stage.sink)
+                    or sink_keys.get(os.path.abspath(stage.sink)) != keys[name]
+                ):
+                    write_sink(stage, keys[name])
+                continue
+            print(f"Stage {name}: running")
+            with instrument_stage(f"pipeline.{name}"):
+                output = stage.func(*[load(i) for i in stage.inputs])
+            values[name] = output
+            if cache_path:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                output.to_parquet(cache_path, index=False)
+            if stage.sink:
+                write_sink(stage, keys[name])
+        self._prune_cache(keys)
+        return {name: load(name) for name in outputs}
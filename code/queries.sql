@@ -1,11 +1,9 @@
 -- Query the number of comments and comment_time
+-- Duplicates are rejected on insert by the content_hash unique index
 SELECT 
     stock, 
     COUNT(*) AS unique_comments_count
-FROM (
-    SELECT DISTINCT stock, comment_time, comments, influence, sentiment_tag
-    FROM "public"."comments"
-) subquery
+FROM "public"."comments"
 GROUP BY stock
 ORDER BY unique_comments_count;
 
@@ -21,7 +19,4 @@ WHERE row_num <= 10
 ORDER BY stock, comment_time;
 
 SELECT COUNT(*) AS unique_comments_count
-FROM (
-  SELECT DISTINCT stock, comment_time, comments,influence,sentiment_tag
-  FROM "public"."comments"
-) subquery;
\ No newline at end of file
+FROM "public"."comments";
\ No newline at end of file
@@ -5,16 +5,35 @@ from statsmodels.tsa.arima.model import ARIMA
 from statsmodels.tsa.api import VAR
 import matplotlib.pyplot as plt
 import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from statsmodels.regression.linear_model import OLS
 from statsmodels.tools import add_constant
 from linearmodels.panel import PanelOLS
 from linearmodels.iv import IVGMM
-from linearmodels.panel.data import PanelData
+from storage import read_table
+from instrumentation import count, stage, timed, write_report
+from pipeline_runner import fingerprint
+from parallel import model_fit_pool
+from model_selection import best_lags, best_order, select_arima_order, select_var_lags
+
+STOCK_ARIMA_SPECS = {
+    "arima_return": ("log_return", ["sentiment_score_lag1"], (0, 0, 0)),
+    "arima_volume": ("log_volume", ["sentiment_score_lag3"], (0, 0, 2)),
+}
+STOCK_VAR_SPECS = {
+    "var_return": (["log_return", "sentiment_score"], 3),
+    "var_volume": (["log_volume", "sentiment_score"], 3),
+}
+GMM_CACHE_SIZE = 8
+GMM_CACHE = OrderedDict()
+_gmm_cache_lock = threading.Lock()
 
 
 def prepare_data_for_arima_var(file_path):
     """Prepares the data for ARIMA and VAR analysis by cleaning, differencing, and adding lagged features."""
-    df = pd.read_excel(file_path)
+    df = read_table(file_path)
     df["date"] = pd.to_datetime(df["date"])
     df = df.sort_values(by="date")
     df.set_index("date", inplace=True)
@@ -51,7 +70,7 @@ def prepare_data_for_arima_var(file_path):
 
 def prepare_data_for_panel_var(file_path):
     """Prepares the data for Panel VAR analysis by setting indices and sorting."""
-    df = pd.read_excel(file_path)
+    df = read_table(file_path)
     df.columns = df.columns.str.strip()
     df["date"] = pd.to_datetime(df["date"])
     df["log_volume"] = np.log(df["volume"] + 1)
@@ -63,6 +82,7 @@ def prepare_data_for_panel_var(file_path):
     return df
 
 
+@timed()
 def run_arima(y_series, x_series, order=(2, 1, 2)):
     """Fits an ARIMA model with exogenous variables."""
     model = ARIMA(y_series, exog=x_series, order=order)
@@ -86,6 +106,7 @@ def plot_arima_fit(actual, fitted, title, filename, output_dir):
     plt.close()
 
 
+@timed()
 def run_var(data, lags=2):
     """Fits a VAR model to the data with the specified number of lags."""
     model = VAR(data)
@@ -178,27 +199,86 @@ def save_arima_results(model, text_output_file, csv_output_file):
     save_results_to_csv(model, csv_output_file)
 
 
-def estimate_gmm(data, dependent_vars, lags, control_vars=None, output_dir=None):
-    """Estimates a dynamic panel model using GMM for single equations and saves results."""
-    results = {}
-    panel_data = PanelData(data)
+def gmm_design(data, dep_var, lags, control_vars=None):
+    """Builds the design of one dynamic panel equation without modifying data.
 
-    for dep_var in dependent_vars:
-        lagged_y = f"{dep_var}_lag1"
-        data[lagged_y] = data.groupby(level=0)[dep_var].shift(1)
+    Returns the formula it corresponds to, the dependent variable and the
+    regressors (an Intercept column, the dependent's first lag within each
+    stock, the sentiment lags and the controls), with incomplete rows dropped.
+    """
+    lagged_y = f"{dep_var}_lag1"
+    x_vars = [f"sentiment_score_lag{lag}" for lag in range(1, lags + 1)]
+    if control_vars:
+        x_vars += list(control_vars)
+    formula = f"{dep_var} ~ {lagged_y} + {' + '.join(x_vars)}"
 
-        x_vars = [f"sentiment_score_lag{lag}" for lag in range(1, lags + 1)]
-        if control_vars:
-            x_vars += control_vars
-
-        formula = f"{dep_var} ~ {lagged_y} + {' + '.join(x_vars)}"
+    design = data[[dep_var, *x_vars]].assign(
+        **{lagged_y: data.groupby(level=0)[dep_var].shift(1)}
+    )
+    design = design.dropna()
+    design.insert(0, "Intercept", 1.0)
+    return formula, design[dep_var], design[["Intercept", lagged_y, *x_vars]]
+
+
+def fit_gmm(data, dep_var, lags, control_vars=None, iter_limit=5000, cache=True):
+    """Fits one GMM equation, reusing the result of an identical earlier fit.
+
+    Results are memoized in GMM_CACHE by the fingerprint of the equation's
+    design, its formula and the fit options. The cache keeps the
+    GMM_CACHE_SIZE most recently used results and drops the oldest beyond
+    that, so a long session does not hold on to every fit.
+    """
+    formula, dependent, exog = gmm_design(data, dep_var, lags, control_vars)
+    key = (
+        fingerprint(exog.assign(**{dep_var: dependent})),
+        formula,
+        (("iter_limit", iter_limit),),
+    )
+    if cache:
+        with _gmm_cache_lock:
+            if key in GMM_CACHE:
+                count("gmm_cache_hits")
+                GMM_CACHE.move_to_end(key)
+                return GMM_CACHE[key]
+    with _gmm_cache_lock:
         print(f"Estimating GMM for {dep_var} with formula: {formula}")
-
-        model = IVGMM.from_formula(formula, data=data)
-        result = model.fit(iter_limit=5000)
-        results[dep_var] = result
-
-        if output_dir:
+    result = IVGMM(dependent, exog, None, None).fit(iter_limit=iter_limit)
+    if cache:
+        with _gmm_cache_lock:
+            GMM_CACHE[key] = result
+            GMM_CACHE.move_to_end(key)
+            while len(GMM_CACHE) > GMM_CACHE_SIZE:
+                GMM_CACHE.popitem(last=False)
+    return result
+
+
+@timed()
+def estimate_gmm(
+    data,
+    dependent_vars,
+    lags,
+    control_vars=None,
+    output_dir=None,
+    n_workers=None,
+    cache=True,
+):
+    """Estimates a dynamic panel model using GMM for single equations and saves results.
+
+    The equations are fitted concurrently on threads, one per dependent
+    variable unless n_workers is given. data is not modified. With
+    cache=False every equation is refitted even if it was fitted before.
+    """
+    with ThreadPoolExecutor(max_workers=n_workers or len(dependent_vars)) as executor:
+        futures = {
+            dep_var: executor.submit(
+                fit_gmm, data, dep_var, lags, control_vars, cache=cache
+            )
+            for dep_var in dependent_vars
+        }
+        results = {dep_var: future.result() for dep_var, future in futures.items()}
+
+    if output_dir:
+        for dep_var, result in results.items():
             csv_file = f"{output_dir}/gmm_{dep_var}_results.csv"
             save_gmm_results_to_csv(result, dep_var, csv_file)
 
@@ -220,20 +300,210 @@ def save_gmm_results_to_csv(result, dep_var, output_file):
     df_results.to_csv(output_file, index=False)
 
 
-def run_analysis(input_file_arima_var, input_file_panel_var, output_dir, steps=10):
-    """Runs ARIMA, VAR, and Panel VAR analyses and saves results."""
+def tidy_arima(result, stock, model_name):
+    """Returns an ARIMA fit's coefficient table as tidy rows."""
+    return pd.DataFrame(
+        {
+            "stock": stock,
+            "model": model_name,
+            "equation": result.model.endog_names,
+            "variable": result.params.index,
+            "coefficient": result.params.values,
+            "std_error": result.bse.values,
+            "t_value": result.tvalues.values,
+            "p_value": result.pvalues.values,
+            "aic": result.aic,
+            "bic": result.bic,
+            "nobs": result.nobs,
+        }
+    )
+
+
+def tidy_var(result, stock, model_name):
+    """Returns a VAR fit's coefficient table, one row per (equation, variable)."""
+    stats = {
+        "coefficient": result.params,
+        "std_error": result.bse,
+        "t_value": result.tvalues,
+        "p_value": result.pvalues,
+    }
+    table = pd.concat(
+        {name: frame.stack() for name, frame in stats.items()}, axis=1
+    ).reset_index(names=["variable", "equation"])
+    return table.assign(
+        stock=stock, model=model_name, aic=result.aic, bic=result.bic, nobs=result.nobs
+    )[
+        [
+            "stock",
+            "model",
+            "equation",
+            "variable",
+            "coefficient",
+            "std_error",
+            "t_value",
+            "p_value",
+            "aic",
+            "bic",
+            "nobs",
+        ]
+    ]
+
+
+def fit_stock_models(stock, data, arima_specs, var_specs, plots_dir=None, steps=10):
+    """Fits the ARIMA and VAR specifications on one stock's series.
+
+    Returns the tidy coefficient rows and a list of error messages for the
+    specifications that could not be fitted.
+    """
+    data = data.reset_index(drop=True)
+    tables = []
+    errors = []
+    for model_name, (y_var, x_vars, order) in arima_specs.items():
+        try:
+            subset = data[[y_var, *x_vars]].dropna()
+            result = ARIMA(subset[y_var], exog=subset[x_vars], order=order).fit()
+            tables.append(tidy_arima(result, stock, model_name))
+            if plots_dir:
+                plot_arima_fit(
+                    subset[y_var],
+                    result.fittedvalues,
+                    f"{stock} {model_name} fit",
+                    f"{stock}_{model_name}_fit.png",
+                    plots_dir,
+                )
+        except Exception as e:
+            errors.append(f"{stock} {model_name}: {e}")
+    for model_name, (variables, lags) in var_specs.items():
+        try:
+            result = VAR(data[variables].dropna()).fit(lags)
+            tables.append(tidy_var(result, stock, model_name))
+            if plots_dir:
+                plot_impulse_response(
+                    result, steps, plots_dir, title_prefix=f"{stock} {model_name}"
+                )
+        except Exception as e:
+            errors.append(f"{stock} {model_name}: {e}")
+    return tables, errors
+
+
+@timed()
+def estimate_per_stock(
+    panel,
+    arima_specs=STOCK_ARIMA_SPECS,
+    var_specs=STOCK_VAR_SPECS,
+    n_workers=None,
+    plots_dir=None,
+    steps=10,
+):
+    """Fits the ARIMA and VAR specifications separately for every stock.
+
+    panel is indexed by (stock, date) as returned by prepare_data_for_panel_var,
+    with the lagged columns the specifications use. Each stock is one task on
+    a spawn-based process pool whose workers run BLAS single-threaded, so the
+    pool rather than BLAS uses the cores. Returns the coefficients of all fits
+    as one tidy DataFrame; plots are only drawn when plots_dir is given.
+    """
+    if plots_dir:
+        os.makedirs(plots_dir, exist_ok=True)
+    groups = {
+        stock: frame.sort_index(level="date")
+        for stock, frame in panel.groupby(level="stock", sort=True)
+    }
+    tables = []
+    with model_fit_pool(n_workers) as executor:
+        futures = {
+            executor.submit(
+                fit_stock_models, stock, frame, arima_specs, var_specs, plots_dir, steps
+            ): stock
+            for stock, frame in groups.items()
+        }
+        for future in as_completed(futures):
+            stock_tables, errors = future.result()
+            tables.extend(stock_tables)
+            for error in errors:
+                print(f"Per-stock fit failed for {error}")
+    if not tables:
+        return pd.DataFrame()
+    return (
+        pd.concat(tables, ignore_index=True)
+        .sort_values(["stock", "model", "equation"], kind="stable")
+        .reset_index(drop=True)
+    )
+
+
+def run_analysis(
+    input_file_arima_var,
+    input_file_panel_var,
+    output_dir,
+    steps=10,
+    plots=True,
+    per_stock=False,
+    n_workers=None,
+    select_specs=False,
+    criterion="aic",
+):
+    """Runs ARIMA, VAR, and Panel VAR analyses and saves results.
+
+    With per_stock=True the ARIMA and VAR specifications are also fitted for
+    each stock (see estimate_per_stock) and saved to per_stock_coefficients.csv.
+    With select_specs=True the ARIMA orders and VAR lag lengths are chosen by
+    criterion ("aic" or "bic") from a grid search instead of the fixed
+    (0, 0, 0), (0, 0, 2) and 3 lags, with each ARIMA d set beforehand by an
+    ADF unit-root test; the ranked grids are saved as
+    model_selection_*.csv. plots=False skips rendering the fit and impulse
+    response figures.
+    """
     os.makedirs(output_dir, exist_ok=True)
 
     df_arima_var = prepare_data_for_arima_var(input_file_arima_var)
+    var_data_return = df_arima_var[["log_return", "daily_weighted_sentiment"]]
+    var_data_volume = df_arima_var[["log_volume", "daily_weighted_sentiment"]]
+    return_order, volume_order = (0, 0, 0), (0, 0, 2)
+    return_lags = volume_lags = 3
+    if select_specs:
+        selections = {
+            "arima_return": select_arima_order(
+                df_arima_var["log_return"],
+                df_arima_var[["daily_weighted_sentiment_lag1"]],
+                criterion=criterion,
+                n_workers=n_workers,
+            ),
+            "arima_volume": select_arima_order(
+                df_arima_var["log_volume"],
+                df_arima_var[["daily_weighted_sentiment_lag3"]],
+                criterion=criterion,
+                n_workers=n_workers,
+            ),
+            "var_return": select_var_lags(
+                var_data_return, criterion=criterion, n_workers=n_workers
+            ),
+            "var_volume": select_var_lags(
+                var_data_volume, criterion=criterion, n_workers=n_workers
+            ),
+        }
+        for name, table in selections.items():
+            table.to_csv(
+                os.path.join(output_dir, f"model_selection_{name}.csv"), index=False
+            )
+        return_order = best_order(selections["arima_return"], default=return_order)
+        volume_order = best_order(selections["arima_volume"], default=volume_order)
+        return_lags = best_lags(selections["var_return"], default=return_lags)
+        volume_lags = best_lags(selections["var_volume"], default=volume_lags)
+        print(
+            f"Selected by {criterion.upper()}: return ARIMA{return_order}, "
+            f"volume ARIMA{volume_order}, "
+            f"return VAR({return_lags}), volume VAR({volume_lags})"
+        )
+
     arma_return = run_arima(
         df_arima_var["log_return"],
         df_arima_var[["daily_weighted_sentiment_lag1"]],
-        order=(0, 0, 0),
+        order=return_order,
     )
     arma_volume = run_arima(
         df_arima_var["log_volume"],
         df_arima_var[["daily_weighted_sentiment_lag3"]],
-        order=(0, 0, 2),
+        order=volume_order,
     )
 
     save_arima_results(
@@ -246,25 +516,24 @@ def run_analysis(input_file_arima_var, input_file_panel_var, output_dir, steps=1
         os.path.join(output_dir, "arima_volume_results.txt"),
         os.path.join(output_dir, "arima_volume_results.csv"),
     )
-    plot_arima_fit(
-        df_arima_var["log_return"],
-        arma_return.fittedvalues,
-        "ARIMA Model Fit for Return",
-        "arima_return_fit.png",
-        output_dir,
-    )
-    plot_arima_fit(
-        df_arima_var["log_volume"],
-        arma_volume.fittedvalues,
-        "ARIMA Model Fit for Volume",
-        "arima_volume_fit.png",
-        output_dir,
-    )
+    if plots:
+        plot_arima_fit(
+            df_arima_var["log_return"],
+            arma_return.fittedvalues,
+            "ARIMA Model Fit for Return",
+            "arima_return_fit.png",
+            output_dir,
+        )
+        plot_arima_fit(
+            df_arima_var["log_volume"],
+            arma_volume.fittedvalues,
+            "ARIMA Model Fit for Volume",
+            "arima_volume_fit.png",
+            output_dir,
+        )
 
-    var_data_return = df_arima_var[["log_return", "daily_weighted_sentiment"]]
-    var_return_model = run_var(var_data_return, lags=3)
-    var_data_volume = df_arima_var[["log_volume", "daily_weighted_sentiment"]]
-    var_volume_model = run_var(var_data_volume, lags=3)
+    var_return_model = run_var(var_data_return, lags=return_lags)
+    var_volume_model = run_var(var_data_volume, lags=volume_lags)
 
     save_variance_decomposition(
         var_return_model, steps, os.path.join(output_dir, "var_return_fevd.txt")
@@ -272,30 +541,39 @@ def run_analysis(input_file_arima_var, input_file_panel_var, output_dir, steps=1
     save_variance_decomposition(
         var_volume_model, steps, os.path.join(output_dir, "var_volume_fevd.txt")
     )
-    plot_impulse_response(
-        var_return_model, steps, output_dir, title_prefix="VAR Return Impulse Response"
-    )
-    plot_impulse_response(
-        var_volume_model, steps, output_dir, title_prefix="VAR Volume Impulse Response"
-    )
+    if plots:
+        plot_impulse_response(
+            var_return_model,
+            steps,
+            output_dir,
+            title_prefix="VAR Return Impulse Response",
+        )
+        plot_impulse_response(
+            var_volume_model,
+            steps,
+            output_dir,
+            title_prefix="VAR Volume Impulse Response",
+        )
 
     df_panel_var = prepare_data_for_panel_var(input_file_panel_var)
     df_panel_var = generate_lagged_variables(df_panel_var, ["sentiment_score"], lags=3)
     df_panel_var = df_panel_var.dropna(
         subset=[f"sentiment_score_lag{lag}" for lag in range(1, 4)]
     )
+    if per_stock:
+        per_stock_results = estimate_per_stock(
+            df_panel_var,
+            n_workers=n_workers,
+            plots_dir=os.path.join(output_dir, "per_stock") if plots else None,
+            steps=steps,
+        )
+        per_stock_results.to_csv(
+            os.path.join(output_dir, "per_stock_coefficients.csv"), index=False
+        )
     dependent_vars = ["log_return", "log_volume"]
     control_vars = ["variation", "log_size"]
 
-    gmm_results = estimate_gmm(
-        data=df_panel_var,
-        dependent_vars=dependent_vars,
-        lags=3,
-        control_vars=control_vars,
-        output_dir=output_dir,
-    )
-
-    gmm_results1 = estimate_gmm(
+    estimate_gmm(
         data=df_panel_var,
         dependent_vars=dependent_vars,
         lags=3,
@@ -305,7 +583,22 @@ def run_analysis(input_file_arima_var, input_file_panel_var, output_dir, steps=1
 
 
 if __name__ == "__main__":
-    input_file_arima_var = "data/processed_dowjones.xlsx"
-    input_file_panel_var = "data/processed_stock_sentiment_data_with_variation.xlsx"
+    input_file_arima_var = "data/processed_dowjones.parquet"
+    input_file_panel_var = "data/processed_stock_sentiment_data_with_variation.parquet"
     output_dir = "artifacts"
-    run_analysis(input_file_arima_var, input_file_panel_var, output_dir, steps=10)
+    PLOTS = True
+    PER_STOCK = False
+    N_WORKERS = None
+    SELECT_SPECS = False
+    with stage("run_analysis"):
+        run_analysis(
+            input_file_arima_var,
+            input_file_panel_var,
+            output_dir,
+            steps=10,
+            plots=PLOTS,
+            per_stock=PER_STOCK,
+            n_workers=N_WORKERS,
+            select_specs=SELECT_SPECS,
+        )
+    write_report()
@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+
+TOTAL_COLUMNS = ["positive_weighted", "negative_weighted", "total_posts"]
+ERROR_LABEL = "error"
+
+
+def daily_sentiment_totals(sentiments):
+    """Aggregates weighted positive/negative influence and post counts per (stock, date).
+
+    Each comment is weighted by ln(1 + influence) + 1. The totals are additive,
+    so totals of separate chunks can be combined with combine_totals.
+    Comments whose inference failed (labelled ERROR_LABEL) are not counted.
+    """
+    sentiments = sentiments[sentiments["sentiment"] != ERROR_LABEL]
+    comment_time = pd.to_datetime(sentiments["comment_time"])
+    influence = pd.to_numeric(sentiments["influence"]).to_numpy(
+        dtype="float64", na_value=np.nan
+    )
+    weighted = np.log1p(influence) + 1
+    sentiment = sentiments["sentiment"].to_numpy()
+    frame = pd.DataFrame(
+        {
+            "stock": sentiments["stock"].to_numpy(),
+            "date": comment_time.dt.normalize().to_numpy(),
+            "positive_weighted": np.where(sentiment == "positive", weighted, 0.0),
+            "negative_weighted": np.where(sentiment == "negative", weighted, 0.0),
+        }
+    )
+    return (
+        frame.groupby(["stock", "date"], sort=True)
+        .agg(
+            positive_weighted=("positive_weighted", "sum"),
+            negative_weighted=("negative_weighted", "sum"),
+            total_posts=("positive_weighted", "size"),
+        )
+        .reset_index()
+    )
+
+
+def combine_totals(totals):
+    """Sums a list of daily totals frames into one row per (stock, date)."""
+    totals = [frame for frame in totals if not frame.empty]
+    if not totals:
+        return pd.DataFrame(columns=["stock", "date"] + TOTAL_COLUMNS)
+    if len(totals) == 1:
+        return totals[0]
+    return (
+        pd.concat(totals, ignore_index=True)
+        .groupby(["stock", "date"], sort=True)[TOTAL_COLUMNS]
+        .sum()
+        .reset_index()
+    )
+
+
+def scores_from_totals(totals):
+    """Computes B_t * ln(1 + M_t) from daily totals, with B_t = 0 when no polar posts exist."""
+    positive = totals["positive_weighted"].to_numpy(dtype="float64")
+    negative = totals["negative_weighted"].to_numpy(dtype="float64")
+    polar = positive + negative
+    with np.errstate(divide="ignore", invalid="ignore"):
+        balance = np.where(polar > 0, (positive - negative) / polar, 0.0)
+    return balance * np.log1p(totals["total_posts"].to_numpy(dtype="float64"))
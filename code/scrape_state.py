@@ -0,0 +1,90 @@
+import hashlib
+import json
+import os
+
+
+def message_key(comment_time, comment):
+    """Returns an 8-byte digest identifying a message by its time and text.
+
+    Influence is left out because like and reply counts change between runs.
+    """
+    content = f"{comment_time}\x1f{comment}".encode("utf-8")
+    return hashlib.blake2b(content, digest_size=8).digest()
+
+
+class ScrapeState:
+    """Per-stock scrape cursor: the messages seen in this run plus a persisted high-water mark.
+
+    The stream is newest first, so the high-water mark is the newest comment
+    date ingested by the last completed run, together with the keys of the
+    messages on that date. A later run skips those messages and stops as
+    soon as a page reaches them or anything older. The mark only advances
+    in commit(), and not at all once write_failed is set, so an interrupted
+    run or one whose rows were not all saved is redone instead of leaving a
+    gap.
+    """
+
+    def __init__(self, stock, state_dir):
+        self.stock = stock
+        self.path = os.path.join(state_dir, f"{stock}.json")
+        self.high_water = None
+        self.boundary_keys = set()
+        if os.path.exists(self.path):
+            with open(self.path, encoding="utf-8") as f:
+                saved = json.load(f)
+            self.high_water = saved.get("high_water")
+            self.boundary_keys = {
+                bytes.fromhex(key) for key in saved.get("boundary_keys", [])
+            }
+        self.seen = set(self.boundary_keys)
+        self.run_high_water = self.high_water
+        self.run_boundary_keys = set(self.boundary_keys)
+        self.reached_high_water = False
+        self.write_failed = False
+
+    def filter_new(self, page):
+        """Returns the rows of a page DataFrame not seen before, updating the cursor.
+
+        Sets reached_high_water once the page contains an already-ingested
+        message or one older than the high-water mark.
+        """
+        keep = []
+        for comment_time, comment in zip(page["comment_time"], page["comments"]):
+            key = message_key(comment_time, comment)
+            if key in self.boundary_keys or (
+                self.high_water is not None and comment_time < self.high_water
+            ):
+                self.reached_high_water = True
+                keep.append(False)
+                continue
+            keep.append(key not in self.seen)
+            self.seen.add(key)
+            if self.run_high_water is None or comment_time > self.run_high_water:
+                self.run_high_water = comment_time
+                self.run_boundary_keys = {key}
+            elif comment_time == self.run_high_water:
+                self.run_boundary_keys.add(key)
+        return page.loc[keep]
+
+    def commit(self):
+        """Persists the newest date ingested by this run and the keys of its messages.
+
+        Returns whether the mark was advanced; it is kept when a write failed.
+        """
+        if self.run_high_water is None or self.write_failed:
+            return False
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "stock": self.stock,
+                    "high_water": self.run_high_water,
+                    "boundary_keys": sorted(key.hex() for key in self.run_boundary_keys),
+                },
+                f,
+            )
+        os.replace(temp_path, self.path)
+        self.high_water = self.run_high_water
+        self.boundary_keys = set(self.run_boundary_keys)
+        return True
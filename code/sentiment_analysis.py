@@ -1,16 +1,32 @@
 import pandas as pd
-import numpy as np
 import os
+import time
 from dotenv import load_dotenv
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
-from transformers import pipeline
-from tqdm import tqdm
 import matplotlib.pyplot as plt
 from sklearn.metrics import confusion_matrix, accuracy_score
+from datastorage import COMMENT_COLUMNS
 from datastorage import get_all_comments
+from datastorage import iter_comments
 from datastorage import save_sentiment
 from datastorage import get_all_sentiments
+from datastorage import update_daily_sentiment
+from datastorage import rebuild_daily_sentiment
+from datastorage import get_daily_sentiment
+from datastorage import migrate_database
+from inference import classify_comments, classify_with_cache
+from inference import load_pipeline, resolve_backend, model_revision
+from inference import ShardedClassifier
+from inference_cache import InferenceCache
+from storage import write_table
+from scoring import daily_sentiment_totals, combine_totals, scores_from_totals
+from instrumentation import stage, timed, write_report
+
+MODEL_NAME = "cardiffnlp/twitter-roberta-base-sentiment-latest"
+ONNX_DIR = "data/onnx_model"
+MIN_LABEL_AGREEMENT = 0.99
+SCORE_COLUMNS = ["stock", "comment_time", "influence", "sentiment"]
 
 
 def write_csv(data, path):
@@ -51,38 +67,109 @@ def comments_analysis(all_comments):
     write_csv(result, path=OUTPUT_DIR1)
 
 
-def sentiment_analysis(all_comments):
-    """Perform text sentiment analysis and save the results."""
-    pipe = pipeline(
-        "text-classification",
-        model="cardiffnlp/twitter-roberta-base-sentiment-latest",
-        tokenizer="cardiffnlp/twitter-roberta-base-sentiment-latest",
-        device=0,
-        truncation=True,
-        padding=True,
-    )
+def _as_chunks(data):
+    """Wrap a single DataFrame so it can be consumed like a stream of chunks."""
+    if isinstance(data, pd.DataFrame):
+        return [data]
+    return data
+
+
+@timed()
+def sentiment_analysis(
+    comment_chunks,
+    cache_path=None,
+    batch_size=64,
+    max_tokens=4096,
+    backend="auto",
+    n_workers=None,
+    incremental=False,
+    db_session=None,
+    classify=None,
+):
+    """Perform text sentiment analysis chunk by chunk and save the results.
+
+    Accepts a DataFrame or an iterable of DataFrame chunks (see iter_comments).
+    With cache_path, results are looked up in a persistent inference cache
+    first and only unseen comments are classified. Comments are batched by
+    token length under max_tokens (at most batch_size per batch); pass
+    max_tokens=None for fixed batches of batch_size in original order.
+    backend selects the inference backend (see inference.load_pipeline), and
+    n_workers > 1 shards inference over that many CPU worker processes.
+    With incremental=True the chunks must only hold newly scored comments,
+    and their totals are added to the daily_sentiment table in the same
+    transaction that saves them, so a crash cannot leave comments scored but
+    missing from the daily totals.
+    Results are saved through db_session (the module's session by default).
+    classify, a callable mapping a list of texts to pipeline-style results,
+    replaces the model entirely, e.g. with a stub in benchmarks.
+    """
+    if db_session is None:
+        db_session = session
+    classifier = None
+    if classify is None and n_workers and n_workers > 1:
+        backend, _ = resolve_backend(backend, device=-1)
+        classifier = ShardedClassifier(
+            MODEL_NAME,
+            n_workers=n_workers,
+            backend=backend,
+            batch_size=batch_size,
+            max_tokens=max_tokens,
+            onnx_dir=ONNX_DIR,
+        )
+        classify = classifier
+    elif classify is None:
+        backend, device = resolve_backend(backend)
+        pipe = load_pipeline(MODEL_NAME, backend, device, onnx_dir=ONNX_DIR)
+
+        def classify(comments):
+            return classify_comments(pipe, comments, batch_size, max_tokens)
+
+    cache = None
+    if cache_path:
+        model_version = f"{model_revision(MODEL_NAME)}:{backend}"
+        cache = InferenceCache(cache_path, MODEL_NAME, model_version)
 
-    comments = all_comments["comments"].astype(str).tolist()
-    batch_size = 16
-    sentiment_results = []
-
-    for i in tqdm(
-        range(0, len(comments), batch_size), desc="Processing comments in batches"
-    ):
-        batch = comments[i : i + batch_size]
-        try:
-            results = pipe(batch)
-            sentiment_results.extend(results)
-        except Exception as e:
-            print(f"Error processing batch {i}: {e}")
-            sentiment_results.extend([{"label": "error", "score": 0.0}] * len(batch))
-    all_comments["sentiment"] = [res["label"] for res in sentiment_results]
-    all_comments["score"] = [res["score"] for res in sentiment_results]
-    save_sentiment(all_comments, session)
-
-
-def check_accuracy(all_sentiments):
-    """Evaluate the accuracy of the sentiment analysis model."""
+    try:
+        for all_comments in _as_chunks(comment_chunks):
+            comments = all_comments["comments"].astype(str).tolist()
+            if cache is None:
+                sentiment_results = classify(comments)
+            else:
+                sentiment_results = classify_with_cache(classify, comments, cache)
+            all_comments["sentiment"] = [res["label"] for res in sentiment_results]
+            all_comments["score"] = [res["score"] for res in sentiment_results]
+            try:
+                with stage("save_sentiment"):
+                    save_sentiment(all_comments, db_session, commit=False)
+                if incremental:
+                    with stage("update_daily_sentiment"):
+                        update_daily_sentiment(
+                            db_session,
+                            daily_sentiment_totals(all_comments),
+                            commit=False,
+                        )
+                db_session.commit()
+            except Exception:
+                db_session.rollback()
+                raise
+    finally:
+        if classifier is not None:
+            classifier.close()
+    if cache is not None:
+        stats = cache.stats()
+        print(
+            f"Inference cache: {stats['hits']} hits, {stats['misses']} misses "
+            f"({stats['hit_rate']:.1%} hit rate), {stats['entries']} entries, "
+            f"{stats['evictions']} evicted"
+        )
+        cache.close()
+
+
+def check_accuracy(all_sentiments, output_path=None):
+    """Evaluate the accuracy of the sentiment analysis model.
+
+    Returns the accuracy; the prediction summary chart is saved to output_path when given.
+    """
     label_mapping = {"Bullish": "positive", "Bearish": "negative"}
     all_sentiments["mapped_sentiment_tag"] = all_sentiments["sentiment_tag"].map(
         label_mapping
@@ -96,6 +183,8 @@ def check_accuracy(all_sentiments):
     y_pred_filtered = filtered_data["sentiment"].str.lower()
     accuracy = accuracy_score(y_true_filtered, y_pred_filtered)
     print(f"Model Accuracy: {accuracy:.2%}")
+    if output_path is None:
+        return accuracy
 
     cm = confusion_matrix(y_true, y_pred, labels=labels)
     correct_predictions = cm.diagonal().sum()
@@ -111,40 +200,100 @@ def check_accuracy(all_sentiments):
     plt.xticks(rotation=30, fontsize=12, ha="right")
     plt.grid(axis="y", linestyle="--", alpha=0.7)
     plt.tight_layout()
-    plt.savefig(OUTPUT_DIR3)
-
-
-def get_sentiment_score(all_sentiments):
-    """Calculate and return the sentiment score."""
-    if not np.issubdtype(all_sentiments["comment_time"].dtype, np.datetime64):
-        all_sentiments["comment_time"] = pd.to_datetime(all_sentiments["comment_time"])
-    all_sentiments["date"] = all_sentiments["comment_time"].dt.date
-    all_sentiments["weighted_influence"] = np.log1p(all_sentiments["influence"]) + 1
-    sentiment_scores = []
-    grouped = all_sentiments.groupby(["stock", "date"])
-    for (stock, date), group in grouped:
-        positive_weighted = group.loc[
-            group["sentiment"] == "positive", "weighted_influence"
-        ].sum()
-        negative_weighted = group.loc[
-            group["sentiment"] == "negative", "weighted_influence"
-        ].sum()
-
-        if (positive_weighted + negative_weighted) > 0:
-            sentiment_score = (positive_weighted - negative_weighted) / (
-                positive_weighted + negative_weighted
-            )
-        else:
-            sentiment_score = 0
+    plt.savefig(output_path)
+    return accuracy
+
+
+def check_backend_parity(
+    all_sentiments, backends=("torch", "quantized", "onnx"), sample_size=2000
+):
+    """Compare inference backends on a sample of scored comments.
 
-        total_posts = len(group)
-        final_score = sentiment_score * np.log1p(total_posts)
+    For each backend, reports throughput, agreement with the stored labels
+    and accuracy against the StockTwits tags (via check_accuracy).
+    """
+    sample = all_sentiments.dropna(subset=["sentiment"])
+    sample = sample.sample(min(sample_size, len(sample)), random_state=0)
+    comments = sample["comments"].astype(str).tolist()
+    print("Stored labels:")
+    reference_accuracy = check_accuracy(sample.copy())
+    rows = []
+    for backend in backends:
+        pipe = load_pipeline(MODEL_NAME, backend, onnx_dir=ONNX_DIR)
+        start = time.perf_counter()
+        results = classify_comments(pipe, comments, batch_size=64, max_tokens=4096)
+        elapsed = time.perf_counter() - start
+        predicted = sample.assign(sentiment=[res["label"] for res in results])
+        print(f"Backend {backend}:")
+        accuracy = check_accuracy(predicted)
+        rows.append(
+            {
+                "backend": backend,
+                "comments_per_sec": len(comments) / elapsed,
+                "label_agreement": (predicted["sentiment"] == sample["sentiment"]).mean(),
+                "accuracy": accuracy,
+                "accuracy_delta": accuracy - reference_accuracy,
+            }
+        )
+    result = pd.DataFrame(rows)
+    print(result.to_string(index=False))
+    return result
+
+
+def require_backend_parity(comments, backend, min_agreement=MIN_LABEL_AGREEMENT):
+    """Checks that backend labels comments like the fp32 model before it is used.
 
-        sentiment_scores.append(
-            {"stock": stock, "date": date, "sentiment_score": final_score}
+    'auto' and 'torch' run the fp32 model and pass as is. For 'quantized'
+    and 'onnx' both models classify the sample comments, and a RuntimeError
+    is raised if they agree on fewer than min_agreement of them, so labels
+    from a drifting backend never mix with fp32 labels in the daily totals.
+    Returns the agreement.
+    """
+    if resolve_backend(backend, device=-1)[0] == "torch":
+        return 1.0
+    if not comments:
+        raise RuntimeError(f"No comments to check the {backend} backend against.")
+    labels = {}
+    for name in ("torch", backend):
+        pipe = load_pipeline(MODEL_NAME, name, onnx_dir=ONNX_DIR)
+        results = classify_comments(pipe, comments, batch_size=64, max_tokens=4096)
+        labels[name] = [res["label"] for res in results]
+    agreement = sum(
+        reference == label for reference, label in zip(labels["torch"], labels[backend])
+    ) / len(comments)
+    print(f"Backend {backend} agrees with the fp32 model on {agreement:.2%} of labels")
+    if agreement < min_agreement:
+        raise RuntimeError(
+            f"Backend {backend} agrees with the fp32 model on {agreement:.2%} of "
+            f"labels, below the required {min_agreement:.2%}; use BACKEND = 'torch'."
         )
-    result = pd.DataFrame(sentiment_scores)
-    write_excel(result, path=OUTPUT_DIR4)
+    return agreement
+
+
+def compute_sentiment_score(all_sentiments):
+    """Calculate the daily sentiment score of each stock.
+
+    Accepts a DataFrame or an iterable of chunks. Each chunk is reduced to
+    per-(stock, date) totals with grouped sums, so memory is bounded by the
+    number of stock-days rather than the number of comments.
+    """
+    totals = combine_totals(
+        [daily_sentiment_totals(chunk) for chunk in _as_chunks(all_sentiments)]
+    )
+    return pd.DataFrame(
+        {
+            "stock": totals["stock"],
+            "date": pd.to_datetime(totals["date"]).dt.date,
+            "sentiment_score": scores_from_totals(totals),
+        }
+    )
+
+
+def get_sentiment_score(all_sentiments, output_path=None):
+    """Calculate and return the sentiment score, saving it to output_path when given."""
+    result = compute_sentiment_score(all_sentiments)
+    if output_path is not None:
+        write_table(result, output_path)
     return result
 
 
@@ -152,7 +301,12 @@ if __name__ == "__main__":
     OUTPUT_DIR1 = "artifacts/comments_amount.csv"
     OUTPUT_DIR2 = "artifacts/comment_sentiment.csv"
     OUTPUT_DIR3 = "artifacts/accuracy.png"
-    OUTPUT_DIR4 = "data/sentiment_score.xlsx"
+    OUTPUT_DIR4 = "data/sentiment_score.parquet"
+    INCREMENTAL = True
+    CACHE_PATH = "data/inference_cache.sqlite"
+    BACKEND = "auto"
+    N_WORKERS = None
+    CHECK_BACKEND_PARITY = False
     os.makedirs("artifacts", exist_ok=True)
     os.makedirs("data", exist_ok=True)
     load_dotenv()
@@ -165,9 +319,39 @@ if __name__ == "__main__":
     engine = create_engine(SQLALCHEMY_DATABASE_URL)
     Session = sessionmaker(bind=engine)
     session = Session()
-    all_comments = get_all_comments(session)
-    comments_analysis(all_comments)
-    sentiment_analysis(all_comments)
-    all_sentiments = get_all_sentiments(session)
-    check_accuracy(all_sentiments)
-    get_sentiment_score(all_sentiments)
+    migrate_database(session)
+    if BACKEND not in ("auto", "torch"):
+        with stage("require_backend_parity"):
+            sample = next(iter_comments(session, ["comments"], chunk_size=2000), None)
+            comments = [] if sample is None else sample["comments"].astype(str).tolist()
+            require_backend_parity(comments, BACKEND)
+    with stage("comments_analysis"):
+        comments_analysis(get_all_comments(session, columns=["stock", "comment_time"]))
+    if INCREMENTAL and get_daily_sentiment(session).empty:
+        with stage("rebuild_daily_sentiment"):
+            rebuild_daily_sentiment(session)
+    sentiment_analysis(
+        iter_comments(
+            session, columns=["comment_id"] + COMMENT_COLUMNS, unscored=INCREMENTAL
+        ),
+        cache_path=CACHE_PATH,
+        backend=BACKEND,
+        n_workers=N_WORKERS,
+        incremental=INCREMENTAL,
+    )
+    if not INCREMENTAL:
+        with stage("rebuild_daily_sentiment"):
+            rebuild_daily_sentiment(session)
+    with stage("check_accuracy"):
+        check_accuracy(
+            get_all_sentiments(session, columns=["sentiment_tag", "sentiment"]),
+            output_path=OUTPUT_DIR3,
+        )
+    if CHECK_BACKEND_PARITY:
+        check_backend_parity(
+            get_all_sentiments(
+                session, columns=["comments", "sentiment_tag", "sentiment"]
+            )
+        )
+    write_table(get_daily_sentiment(session), OUTPUT_DIR4)
+    write_report(backend=BACKEND, incremental=INCREMENTAL, n_workers=N_WORKERS)
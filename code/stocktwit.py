@@ -1,6 +1,8 @@
 import requests
 import pandas as pd
 import os
+import queue
+import threading
 import time
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
@@ -13,12 +15,28 @@ from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.common.action_chains import ActionChains
 from selenium.common.exceptions import ElementClickInterceptedException
 from dotenv import load_dotenv
-from datastorage import save_to_database
+from datastorage import bulk_save_to_database, migrate_database
+from ingest import IngestService, IngestStoppedError, write_csv
+from scrape_state import ScrapeState
+from stocktwits_api import STOCKTWITS_API_URL, iter_stream_pages, make_http_session
+from instrumentation import count, timed, write_report
+from waits import (
+    STAGE_LATENCY,
+    message_count,
+    message_count_increased,
+    network_idle,
+    scroll_height,
+    scroll_height_changed,
+    wait_until,
+)
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
 
-def get_url(path):
+STOCKTWITS_SYMBOL_URL = "https://stocktwits.com/symbol/"
+
+
+def get_url(path, base_url=STOCKTWITS_SYMBOL_URL):
     """
     Reads a file containing stock symbols, generates a list of StockTwits URLs for each symbol, and returns these URLs along with stock names.
     """
@@ -30,7 +48,7 @@ def get_url(path):
         c = cell_value
         list.append(c)
     for i in list:
-        url = "https://stocktwits.com/symbol/" + i
+        url = base_url + i
         stock_name.append(i)
         url_list.append(url)
     return url_list, stock_name
@@ -46,179 +64,298 @@ def log_in(driver, account, key):
         )
     )
     sign_up.click()
-    time.sleep(2)
     account_id = WebDriverWait(driver, 20).until(
         EC.presence_of_element_located((By.CSS_SELECTOR, "input[name='login']"))
     )
     account_id.send_keys(account)
-    time.sleep(0.5)
     account_keys = driver.find_element(By.CSS_SELECTOR, "input[name='password']")
     account_keys.send_keys(key)
-    time.sleep(0.5)
     driver.find_element(By.CSS_SELECTOR, "button[data-testid='log-in-submit']").click()
-    time.sleep(5)
+    wait_until(
+        lambda: not driver.find_elements(By.CSS_SELECTOR, "input[name='password']"),
+        timeout=10,
+        stage="login",
+    )
+    wait_until(network_idle(driver), timeout=10, stage="login_network_idle")
     return None
 
 
 def scroll(driver, fetch_interval=5, step_size=1500, pause_time=0.5):
     """
     Scrolls down a webpage multiple times to load more content using the WebDriver.
+    After each step it waits up to pause_time for new messages, so the lazy loader sees every step.
     """
+    previous_count = message_count(driver)
     for _ in range(fetch_interval):
         driver.execute_script(f"window.scrollBy(0, {step_size});")
-        time.sleep(pause_time)
-    time.sleep(pause_time * 2)
+        loaded = wait_until(
+            message_count_increased(driver, previous_count),
+            timeout=pause_time,
+            stage="scroll_new_messages",
+        )
+        if loaded:
+            previous_count = message_count(driver)
 
 
 def scroll_to_bottom(driver, wait_time=5):
     """
     Scrolls to the bottom of a webpage until no more new content loads.
+    Each step returns as soon as the page grows; wait_time is the longest it waits for that.
     """
-    last_height = driver.execute_script("return document.body.scrollHeight")
+    last_height = scroll_height(driver)
     while True:
         driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-        time.sleep(wait_time)
-        new_height = driver.execute_script("return document.body.scrollHeight")
-        if new_height == last_height:
+        grown = wait_until(
+            scroll_height_changed(driver, last_height),
+            timeout=wait_time,
+            stage="scroll_to_bottom",
+        )
+        if not grown:
             break
-        last_height = new_height
+        last_height = scroll_height(driver)
+
+
+EXTRACT_MESSAGES_SCRIPT = """
+const times = document.querySelectorAll("time[class*='StreamMessage_timestamp']");
+const bodies = document.querySelectorAll("div[class*='RichTextMessage_body']");
+let offset;
+if (times.length === bodies.length - 1) {
+    offset = 1;
+} else if (times.length === bodies.length) {
+    offset = 0;
+} else {
+    return {mismatch: [times.length, bodies.length]};
+}
+const rows = [];
+for (let i = 0; i < times.length; i++) {
+    const body = bodies[i + offset];
+    const sentiment = body.parentElement.querySelector(
+        "span[class*='StreamMessage_sentimentText']"
+    );
+    const main = body.closest("div[class*='StreamMessage_main']");
+    const labels = main
+        ? main.querySelectorAll("span[class*='StreamMessageLabelCount_labelCount']")
+        : [];
+    rows.push({
+        time: times[i].getAttribute("datetime"),
+        body: body.innerText.trim(),
+        sentiment: sentiment ? sentiment.innerText.trim() : null,
+        labels: Array.from(labels, (label) => label.innerText),
+    });
+}
+return {rows: rows};
+"""
+
 
+COUNT_SUFFIXES = {"K": 1_000, "M": 1_000_000, "B": 1_000_000_000}
 
-def get_comments_one_page(driver):
+
+def parse_count(text):
     """
-    Extracts comment times, content, sentiment tags, and influence data from a single page of StockTwits.
+    Parses a label count as shown on the page ('', '7', '1,234', '1.2K', '3M') into an int.
+    """
+    text = text.strip().replace(",", "").upper()
+    if not text:
+        return 0
+    multiplier = COUNT_SUFFIXES.get(text[-1], 1)
+    if multiplier > 1:
+        text = text[:-1]
+    return int(round(float(text) * multiplier))
+
+
+def label_influence(texts):
+    """
+    Sums a message's reply, reshare, like and other label counts; 0 unless all four labels are present.
+    Both extraction modes use it, so they agree on every count format.
+    """
+    if len(texts) != 4:
+        return 0
+    try:
+        return sum(parse_count(text) for text in texts)
+    except ValueError as e:
+        print(e)
+        return 0
+
+
+def _alignment_offset(n_times, n_bodies):
+    """
+    Returns how many message bodies precede the first timestamped one, or None if the counts cannot be aligned.
+    """
+    if n_times == n_bodies - 1:
+        return 1
+    if n_times == n_bodies:
+        return 0
+    return None
+
+
+def _comment_date(datetime):
+    pos = datetime.find("T")
+    return datetime[:pos]
+
+
+def _get_comments_one_page_js(driver):
+    """
+    Extracts all messages in the DOM with a single execute_script round-trip.
     """
     comment_time = []
     comments = []
     sentiments_tag = []
     influence = []
+    result = driver.execute_script(EXTRACT_MESSAGES_SCRIPT)
+    if "mismatch" in result:
+        print(*result["mismatch"])
+        return comment_time, comments, sentiments_tag, influence
+    for row in result["rows"]:
+        comment_time.append(_comment_date(row["time"]))
+        comments.append(row["body"])
+        sentiments_tag.append(row["sentiment"])
+        influence.append(label_influence(row["labels"]))
+    return comment_time, comments, sentiments_tag, influence
+
+
+def _get_comments_one_page_webdriver(driver):
+    """
+    Extracts messages element by element through WebDriver calls.
+    """
+    comment_time = []
+    comments = []
+    sentiments_tag = []
+    influence = []
+    time_elements = driver.find_elements(
+        By.XPATH, "//time[contains(@class, 'StreamMessage_timestamp')]"
+    )
+    comments_elements = driver.find_elements(
+        By.XPATH, "//div[contains(@class, 'RichTextMessage_body')]"
+    )
+    offset = _alignment_offset(len(time_elements), len(comments_elements))
+    if offset is None:
+        print(len(time_elements), len(comments_elements))
+        return comment_time, comments, sentiments_tag, influence
+    for i in range(0, len(time_elements)):
+        try:
+            datetime = time_elements[i].get_attribute("datetime")
+            comment_time.append(_comment_date(datetime))
+            comments.append(comments_elements[i + offset].text)
+            try:
+                parent_element = comments_elements[i + offset].find_element(
+                    By.XPATH, ".."
+                )
+                sentiment_element = parent_element.find_elements(
+                    By.XPATH,
+                    ".//span[contains(@class, 'StreamMessage_sentimentText')]",
+                )
+                if sentiment_element:
+                    sentiments_tag.append(sentiment_element[0].text)
+                else:
+                    sentiments_tag.append(None)
+            except:
+                sentiments_tag.append(None)
+            try:
+                parent_element2 = comments_elements[i + offset].find_element(
+                    By.XPATH,
+                    "./ancestor::div[contains(@class, 'StreamMessage_main')]",
+                )
+                influence_elements = parent_element2.find_elements(
+                    By.XPATH,
+                    ".//span[contains(@class, 'StreamMessageLabelCount_labelCount')]",
+                )
+                influence.append(
+                    label_influence([el.text for el in influence_elements])
+                )
+            except Exception as e:
+                influence.append(0)
+                print(e)
+                pass
+        except Exception as e:
+            print(e)
+            pass
+    return comment_time, comments, sentiments_tag, influence
+
+
+EXTRACTION_MODES = {
+    "js": _get_comments_one_page_js,
+    "webdriver": _get_comments_one_page_webdriver,
+}
+
+
+def get_comments_one_page(driver, mode="js"):
+    """
+    Extracts comment times, content, sentiment tags, and influence data from a single page of StockTwits.
+    The 'js' mode reads every message in one execute_script call; 'webdriver' queries each element separately.
+    """
+    if mode not in EXTRACTION_MODES:
+        raise ValueError(f"Unknown extraction mode {mode!r}")
     try:
         WebDriverWait(driver, 10).until(
             EC.presence_of_element_located(
                 (By.XPATH, "//time[contains(@class, 'StreamMessage_timestamp')]")
             )
         )
-        time_elements = driver.find_elements(
-            By.XPATH, "//time[contains(@class, 'StreamMessage_timestamp')]"
-        )
-        comments_elements = driver.find_elements(
-            By.XPATH, "//div[contains(@class, 'RichTextMessage_body')]"
-        )
-        time.sleep(2)
-        if len(time_elements) == len(comments_elements) - 1:
-            for i in range(0, len(time_elements)):
-                try:
-                    datetime = time_elements[i].get_attribute("datetime")
-                    pos = datetime.find("T")
-                    comment_time.append(datetime[:pos])
-                    comments.append(comments_elements[i + 1].text)
-                    try:
-                        parent_element1 = comments_elements[i + 1].find_element(
-                            By.XPATH, ".."
-                        )
-                        sentiment_element = parent_element1.find_elements(
-                            By.XPATH,
-                            ".//span[contains(@class, 'StreamMessage_sentimentText')]",
-                        )
-                        if sentiment_element:
-                            sentiments_tag.append(sentiment_element[0].text)
-                        else:
-                            sentiments_tag.append(None)
-                    except:
-                        sentiments_tag.append(None)
-                    try:
-                        parent_element2 = comments_elements[i + 1].find_element(
-                            By.XPATH,
-                            "./ancestor::div[contains(@class, 'StreamMessage_main')]",
-                        )
-                        influence_elements = parent_element2.find_elements(
-                            By.XPATH,
-                            ".//span[contains(@class, 'StreamMessageLabelCount_labelCount')]",
-                        )
-                        if len(influence_elements) == 4:
-                            label_sum = sum(
-                                int(el.text) if el.text.strip() else 0
-                                for el in influence_elements
-                            )
-                        else:
-                            label_sum = 0
-                        influence.append(label_sum)
-                    except Exception as e:
-                        influence.append(0)
-                        print(e)
-                        pass
-                except Exception as e:
-                    print(e)
-                    pass
-        elif len(time_elements) == len(comments_elements):
-            for i in range(0, len(time_elements)):
-                try:
-                    datetime = time_elements[i].get_attribute("datetime")
-                    pos = datetime.find("T")
-                    comment_time.append(datetime[:pos])
-                    comments.append(comments_elements[i].text)
-                    try:
-                        parent_element = comments_elements[i].find_element(
-                            By.XPATH, ".."
-                        )
-                        sentiment_element = parent_element.find_elements(
-                            By.XPATH,
-                            ".//span[contains(@class, 'StreamMessage_sentimentText')]",
-                        )
-                        if sentiment_element:
-                            sentiments_tag.append(sentiment_element[0].text)
-                        else:
-                            sentiments_tag.append(None)
-                    except:
-                        sentiments_tag.append(None)
-                    try:
-                        parent_element2 = comments_elements[i].find_element(
-                            By.XPATH,
-                            "./ancestor::div[contains(@class, 'StreamMessage_main')]",
-                        )
-                        influence_elements = parent_element2.find_elements(
-                            By.XPATH,
-                            ".//span[contains(@class, 'StreamMessageLabelCount_labelCount')]",
-                        )
-                        if len(influence_elements) == 4:
-                            label_sum = sum(
-                                int(el.text) if el.text.strip() else 0
-                                for el in influence_elements
-                            )
-                        else:
-                            label_sum = 0
-                        influence.append(label_sum)
-                    except Exception as e:
-                        influence.append(0)
-                        print(e)
-                        pass
-                except Exception as e:
-                    print(e)
-                    pass
-        else:
-            print(len(time_elements), len(comments_elements))
-            pass
+        page = EXTRACTION_MODES[mode](driver)
+        count("pages_scraped")
+        return page
     except Exception as e:
         print(e)
-    return comment_time, comments, sentiments_tag, influence
+    return [], [], [], []
+
+
+def save_new_rows(state, page, stock, session, csv_path, sink=None):
+    """
+    Writes the rows of a scraped page not seen before to the database and CSV, returning how many there were.
+    With a sink (an IngestService) the rows are queued for its writer instead of written inline.
+    A failed write sets state.write_failed, so the stock's high-water mark is not advanced past the lost rows.
+    """
+    new_rows = state.filter_new(page)
+    if new_rows.empty:
+        return 0
+    new_rows.insert(loc=0, column="stock", value=stock)
+    count("comments_scraped", len(new_rows))
+    if sink is not None:
+        sink.submit(new_rows)
+        return len(new_rows)
+    try:
+        with STAGE_LATENCY.time("save_database"):
+            bulk_save_to_database(new_rows, session)
+    except Exception as e:
+        state.write_failed = True
+        print(f"Error saving to database for stock {stock}: {e}")
+        session.rollback()
+    try:
+        with STAGE_LATENCY.time("save_csv"):
+            write_csv(new_rows, stock, csv_path)
+    except Exception as e:
+        state.write_failed = True
+        print(f"Error writing to CSV for stock {stock}: {e}")
+    return len(new_rows)
 
 
-def write_csv(data, company, path):
+def finish_stock(state, stock, sink=None):
     """
-    Saves extracted data to a CSV file for a given company, appending to the file if it already exists.
+    Advances the stock's high-water mark once the run reached it (or it is the first run) and every row is written.
+    If any write failed the previous mark is kept, so the next run scrapes the lost rows again.
     """
-    file_path = os.path.join(path, f"{company}.csv")
-    write_header = not os.path.exists(file_path)
-    data.to_csv(file_path, mode="a+", index=False, header=write_header, sep=",")
+    if not (state.reached_high_water or state.high_water is None):
+        return
+    if sink is not None and not sink.flush(stock):
+        state.write_failed = True
+    if not state.commit() and state.write_failed:
+        print(
+            f"Some rows for stock {stock} were not saved; "
+            "keeping the previous high-water mark so they are scraped again."
+        )
 
 
-def get_comments_one_stock(driver, stock, session, csv_path, max_duration=11000):
+@timed("scrape_stock")
+def get_comments_one_stock(
+    driver, stock, session, csv_path, max_duration=11000, state_dir=None, sink=None
+):
     """
     Collects comments and metadata for a single stock over multiple pages and saves the data to a database and CSV.
+    New rows are written page by page and only their count is returned. Scraping stops early once it reaches
+    messages ingested by an earlier run (see ScrapeState, kept under state_dir, by default csv_path/.state).
     """
-    all_information = pd.DataFrame()
-    old_information = pd.DataFrame()
-    time.sleep(1)
+    state = ScrapeState(stock, state_dir or os.path.join(csv_path, ".state"))
+    saved_rows = 0
     scroll(driver, fetch_interval=2, step_size=1000, pause_time=0.5)
     n = 0
     start_time = time.time()
@@ -230,10 +367,10 @@ def get_comments_one_stock(driver, stock, session, csv_path, max_duration=11000)
             )
             break
         try:
-            comment_time, comments, sentiments_tag, influence = get_comments_one_page(
-                driver
-            )
-            time.sleep(1)
+            with STAGE_LATENCY.time("extract_page"):
+                comment_time, comments, sentiments_tag, influence = (
+                    get_comments_one_page(driver)
+                )
             current_information = pd.DataFrame(
                 {
                     "comment_time": comment_time,
@@ -242,24 +379,12 @@ def get_comments_one_stock(driver, stock, session, csv_path, max_duration=11000)
                     "influence": influence,
                 }
             )
-            if not old_information.empty:
-                current_information = current_information[
-                    ~current_information["comments"].isin(old_information["comments"])
-                ]
-            if not current_information.empty:
-                current_information.insert(loc=0, column="stock", value=stock)
-                all_information = pd.concat(
-                    [all_information, current_information], ignore_index=True
-                )
-                try:
-                    save_to_database(current_information, session)
-                except Exception as e:
-                    print(f"Error saving to database for stock {stock}: {e}")
-                try:
-                    write_csv(current_information, stock, csv_path)
-                except Exception as e:
-                    print(f"Error writing to CSV for stock {stock}: {e}")
-            old_information = current_information
+            saved_rows += save_new_rows(
+                state, current_information, stock, session, csv_path, sink
+            )
+            if state.reached_high_water:
+                print(f"Reached messages already ingested for stock {stock}, stopping.")
+                break
             if n < 5:
                 scroll(driver, fetch_interval=5, step_size=1500, pause_time=0.5)
             elif n > 10:
@@ -267,12 +392,69 @@ def get_comments_one_stock(driver, stock, session, csv_path, max_duration=11000)
             else:
                 scroll_to_bottom(driver, wait_time=5)
             n += 1
-            time.sleep(1)
-        except Exception as e:
+        except IngestStoppedError:
+            raise
+        except Exception:
             n += 1
             time.sleep(1)
             continue
-    return all_information
+    finish_stock(state, stock, sink)
+    return saved_rows
+
+
+@timed("scrape_stock")
+def get_comments_one_stock_api(
+    http,
+    stock,
+    session,
+    csv_path,
+    max_duration=11000,
+    state_dir=None,
+    api_url=STOCKTWITS_API_URL,
+    max_pages=1400,
+    sink=None,
+):
+    """
+    Collects comments for a single stock from the StockTwits JSON stream instead of a browser.
+    Writes and stops the same way as get_comments_one_stock; HTTP errors left after retries are raised.
+    """
+    state = ScrapeState(stock, state_dir or os.path.join(csv_path, ".state"))
+    saved_rows = 0
+    start_time = time.time()
+    pages = iter_stream_pages(http, stock, base_url=api_url, max_pages=max_pages)
+    while True:
+        with STAGE_LATENCY.time("api_page"):
+            page = next(pages, None)
+        if page is None:
+            break
+        saved_rows += save_new_rows(state, page, stock, session, csv_path, sink)
+        if state.reached_high_water:
+            print(f"Reached messages already ingested for stock {stock}, stopping.")
+            break
+        elapsed_time = time.time() - start_time
+        if elapsed_time > max_duration:
+            print(
+                f"Reached max duration for stock, exiting after {elapsed_time:.2f} seconds."
+            )
+            break
+    finish_stock(state, stock, sink)
+    return saved_rows
+
+
+def make_driver():
+    """
+    Starts a headless Chrome WebDriver configured for scraping.
+    """
+    chrome_options = webdriver.ChromeOptions()
+    chrome_options.add_argument("--headless")
+    chrome_options.add_argument("--no-sandbox")
+    chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
+    chrome_options.add_argument("--disable-gpu")
+    chrome_options.add_argument("--blink-settings=imagesEnabled=false")
+    chrome_options.add_argument("--disable-blink-features=AutomationControlled")
+    chrome_options.add_argument("--ignore-certificate-errors")
+    chrome_options.add_argument("--window-size=1920,1080")
+    return webdriver.Chrome(options=chrome_options)
 
 
 def get_comments_all_stock(path, account, key, session):
@@ -284,33 +466,223 @@ def get_comments_all_stock(path, account, key, session):
     if not os.path.exists(csv_path):
         os.makedirs(csv_path)
     for url, stock in zip(url_list, stock_name):
-        chrome_options = webdriver.ChromeOptions()
-        chrome_options.add_argument("--headless")
-        chrome_options.add_argument("--no-sandbox")
-        chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
-        chrome_options.add_argument("--disable-gpu")
-        chrome_options.add_argument("--blink-settings=imagesEnabled=false")
-        chrome_options.add_argument("--disable-blink-features=AutomationControlled")
-        chrome_options.add_argument("--ignore-certificate-errors")
-        chrome_options.add_argument("--window-size=1920,1080")
-        driver = webdriver.Chrome(options=chrome_options)
+        driver = make_driver()
         try:
             driver.get(url)
-            time.sleep(5)
             log_in(driver, account, key)
             get_comments_one_stock(driver, stock, session, csv_path)
         except Exception as e:
             print(f"Error while scraping stock {stock}: {e}")
         finally:
             driver.quit()
-            time.sleep(5)
     return None
 
 
+class BrowserWorker:
+    """
+    A reusable logged-in browser session that scrapes one ticker at a time and keeps throughput stats.
+    """
+
+    def __init__(self, worker_id, account, key, driver_factory=make_driver):
+        self.worker_id = worker_id
+        self.account = account
+        self.key = key
+        self.driver_factory = driver_factory
+        self.driver = None
+        self.logged_in = False
+        self.stats = {
+            "worker": worker_id,
+            "tickers": 0,
+            "comments": 0,
+            "failures": 0,
+            "rebuilds": 0,
+            "busy_seconds": 0.0,
+        }
+
+    def scrape(self, url, stock, session, csv_path, max_duration, sink=None):
+        """Loads the ticker page in the existing browser and scrapes it, logging in on first use."""
+        if self.driver is None:
+            self.driver = self.driver_factory()
+        start_time = time.time()
+        with STAGE_LATENCY.time("page_load"):
+            self.driver.get(url)
+        if not self.logged_in and self.account:
+            log_in(self.driver, self.account, self.key)
+        self.logged_in = True
+        saved_rows = get_comments_one_stock(
+            self.driver, stock, session, csv_path, max_duration=max_duration, sink=sink
+        )
+        self.stats["tickers"] += 1
+        self.stats["comments"] += saved_rows
+        self.stats["busy_seconds"] += time.time() - start_time
+
+    def rebuild(self):
+        """Discards a failed browser; a fresh one is started and logged in on the next ticker."""
+        self.quit()
+        self.logged_in = False
+        self.stats["failures"] += 1
+        self.stats["rebuilds"] += 1
+
+    def quit(self):
+        if self.driver is not None:
+            try:
+                self.driver.quit()
+            except Exception as e:
+                print(f"Error closing browser for worker {self.worker_id}: {e}")
+            self.driver = None
+
+
+class ApiWorker:
+    """
+    Collects tickers through the JSON API over a shared pooled HTTP session, with the same interface as BrowserWorker.
+    """
+
+    def __init__(self, worker_id, http, api_url=STOCKTWITS_API_URL):
+        self.worker_id = worker_id
+        self.http = http
+        self.api_url = api_url
+        self.stats = {
+            "worker": worker_id,
+            "tickers": 0,
+            "comments": 0,
+            "failures": 0,
+            "rebuilds": 0,
+            "busy_seconds": 0.0,
+        }
+
+    def scrape(self, url, stock, session, csv_path, max_duration, sink=None):
+        start_time = time.time()
+        saved_rows = get_comments_one_stock_api(
+            self.http,
+            stock,
+            session,
+            csv_path,
+            max_duration=max_duration,
+            api_url=self.api_url,
+            sink=sink,
+        )
+        self.stats["tickers"] += 1
+        self.stats["comments"] += saved_rows
+        self.stats["busy_seconds"] += time.time() - start_time
+
+    def rebuild(self):
+        self.stats["failures"] += 1
+
+    def quit(self):
+        pass
+
+
+SCRAPE_BACKENDS = ("selenium", "api")
+
+
+def _run_worker(
+    worker, tasks, session_factory, csv_path, max_duration, max_attempts, sink=None
+):
+    """
+    Takes tickers from the queue until it is empty, rebuilding the browser and requeueing a ticker after a failure.
+    """
+    session = session_factory()
+    try:
+        while True:
+            try:
+                url, stock, attempt = tasks.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                worker.scrape(url, stock, session, csv_path, max_duration, sink)
+            except Exception as e:
+                print(f"Worker {worker.worker_id} failed on stock {stock}: {e}")
+                worker.rebuild()
+                if attempt + 1 < max_attempts:
+                    tasks.put((url, stock, attempt + 1))
+            finally:
+                tasks.task_done()
+    finally:
+        worker.quit()
+        session.close()
+
+
+def scrape_all_stocks(
+    path,
+    account,
+    key,
+    session_factory,
+    n_workers=4,
+    base_url=STOCKTWITS_SYMBOL_URL,
+    csv_path="./comments",
+    max_duration=11000,
+    max_attempts=2,
+    driver_factory=make_driver,
+    backend="selenium",
+    api_url=STOCKTWITS_API_URL,
+    async_writes=True,
+):
+    """
+    Scrapes all tickers with a bounded pool of workers and returns per-worker stats.
+    backend 'selenium' uses reusable browser sessions; 'api' reads the JSON stream over one pooled HTTP session.
+    With async_writes, workers hand rows to an IngestService that batches the database and CSV writes.
+    """
+    if backend not in SCRAPE_BACKENDS:
+        raise ValueError(
+            f"Unknown scrape backend {backend!r}, expected one of {SCRAPE_BACKENDS}"
+        )
+    url_list, stock_name = get_url(path, base_url)
+    os.makedirs(csv_path, exist_ok=True)
+    tasks = queue.Queue()
+    for url, stock in zip(url_list, stock_name):
+        tasks.put((url, stock, 0))
+    n_workers = min(n_workers, len(url_list))
+    if backend == "api":
+        http = make_http_session(pool_size=max(n_workers, 1))
+        workers = [ApiWorker(i, http, api_url) for i in range(n_workers)]
+    else:
+        workers = [
+            BrowserWorker(i, account, key, driver_factory) for i in range(n_workers)
+        ]
+    sink = IngestService(session_factory, csv_path).start() if async_writes else None
+    threads = [
+        threading.Thread(
+            target=_run_worker,
+            args=(
+                worker,
+                tasks,
+                session_factory,
+                csv_path,
+                max_duration,
+                max_attempts,
+                sink,
+            ),
+            daemon=True,
+        )
+        for worker in workers
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if backend == "api":
+        http.close()
+    if sink is not None:
+        sink.close()
+        counters, write_latency = sink.metrics()
+        print(counters)
+        print(write_latency.to_string(index=False))
+    stats = pd.DataFrame([worker.stats for worker in workers])
+    if not stats.empty:
+        stats["comments_per_sec"] = stats["comments"] / stats["busy_seconds"].where(
+            stats["busy_seconds"] > 0
+        )
+    print(stats.to_string(index=False))
+    print(STAGE_LATENCY.summary().to_string(index=False))
+    return stats
+
+
 if __name__ == "__main__":
     account = ""
     key = ""
     path = "data/Dow_Jones_Average_Index_companies.xlsx"
+    N_WORKERS = 4
+    BACKEND = "selenium"
     load_dotenv()
     DATABASE_USERNAME = os.getenv("DATABASE_USERNAME")
     DATABASE_PASSWORD = os.getenv("DATABASE_PASSWORD")
@@ -320,5 +692,9 @@ if __name__ == "__main__":
     SQLALCHEMY_DATABASE_URL = f"postgresql://{DATABASE_USERNAME}:{DATABASE_PASSWORD}@{DATABASE_HOST}:{DATABASE_PORT}/{DATABASE_DATABASE}"
     engine = create_engine(SQLALCHEMY_DATABASE_URL)
     Session = sessionmaker(bind=engine)
-    session = Session()
-    get_comments_all_stock(path, account, key, session)
+    with Session() as session:
+        migrate_database(session)
+    scrape_all_stocks(
+        path, account, key, Session, n_workers=N_WORKERS, backend=BACKEND
+    )
+    write_report(backend=BACKEND, n_workers=N_WORKERS)
@@ -0,0 +1,89 @@
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+STOCKTWITS_API_URL = "https://api.stocktwits.com/api/2/streams/symbol/"
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+RECORD_COLUMNS = ["comment_time", "comments", "sentiment_tag", "influence"]
+
+
+def make_http_session(pool_size=10, max_retries=5, backoff_factor=1.0):
+    """Returns a keep-alive requests.Session with a connection pool and rate-limit aware retries.
+
+    429 and 5xx responses are retried with exponential backoff, honouring a
+    Retry-After header when the server sends one.
+    """
+    retry = Retry(
+        total=max_retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=RETRY_STATUSES,
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry
+    )
+    http = requests.Session()
+    http.mount("https://", adapter)
+    http.mount("http://", adapter)
+    http.headers["Accept"] = "application/json"
+    return http
+
+
+def parse_message(message):
+    """Converts one API message into the (comment_time, comments, sentiment_tag, influence) fields.
+
+    Influence is replies + reshares + likes, the counts the web page labels show.
+    """
+    sentiment = ((message.get("entities") or {}).get("sentiment") or {}).get("basic")
+    influence = (
+        ((message.get("conversation") or {}).get("replies") or 0)
+        + ((message.get("reshares") or {}).get("reshared_count") or 0)
+        + ((message.get("likes") or {}).get("total") or 0)
+    )
+    created_at = message.get("created_at") or ""
+    pos = created_at.find("T")
+    return {
+        "comment_time": created_at[:pos] if pos >= 0 else created_at,
+        "comments": message.get("body") or "",
+        "sentiment_tag": sentiment,
+        "influence": influence,
+    }
+
+
+def iter_stream_pages(
+    http,
+    symbol,
+    base_url=STOCKTWITS_API_URL,
+    since=None,
+    max_id=None,
+    max_pages=None,
+    timeout=30,
+):
+    """Yields the symbol stream one page at a time as a DataFrame of RECORD_COLUMNS.
+
+    Pages run from newest to oldest by following the cursor's max ID; since
+    limits the stream to messages newer than that ID. Raises
+    requests.HTTPError once retries are exhausted.
+    """
+    url = f"{base_url}{symbol}.json"
+    pages = 0
+    while max_pages is None or pages < max_pages:
+        params = {}
+        if since is not None:
+            params["since"] = since
+        if max_id is not None:
+            params["max"] = max_id
+        response = http.get(url, params=params, timeout=timeout)
+        response.raise_for_status()
+        payload = response.json()
+        messages = payload.get("messages") or []
+        pages += 1
+        yield pd.DataFrame(
+            [parse_message(message) for message in messages], columns=RECORD_COLUMNS
+        )
+        cursor = payload.get("cursor") or {}
+        if not messages or not cursor.get("more") or cursor.get("max") is None:
+            return
+        max_id = cursor["max"]
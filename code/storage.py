@@ -0,0 +1,131 @@
+import datetime
+import os
+import shutil
+import sys
+import pandas as pd
+
+EXCEL_SUFFIXES = (".xlsx", ".xls")
+FEATHER_SUFFIXES = (".feather", ".arrow")
+DEFAULT_SUFFIX = ".parquet"
+
+_OPERATORS = {
+    "==": lambda column, value: column == value,
+    "=": lambda column, value: column == value,
+    "!=": lambda column, value: column != value,
+    "<": lambda column, value: column < value,
+    "<=": lambda column, value: column <= value,
+    ">": lambda column, value: column > value,
+    ">=": lambda column, value: column >= value,
+    "in": lambda column, value: column.isin(value),
+    "not in": lambda column, value: ~column.isin(value),
+}
+
+
+def _suffix(path):
+    return os.path.splitext(path)[1].lower()
+
+
+def legacy_excel_path(path):
+    """Returns the existing Excel file with the same stem as path, or None."""
+    stem = os.path.splitext(path)[0]
+    for suffix in EXCEL_SUFFIXES:
+        if os.path.exists(stem + suffix):
+            return stem + suffix
+    return None
+
+
+def write_table(df, path, partition_cols=None):
+    """Writes a DataFrame to Parquet, Feather or Excel depending on the path suffix.
+
+    Parquet output can be partitioned into one directory per value of
+    partition_cols (e.g. ["stock"]); an existing dataset at path is replaced.
+    A 'date' column is stored as a timestamp and rows are sorted by it, so
+    row-group statistics allow date filters to skip data.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    suffix = _suffix(path)
+    if suffix == ".parquet":
+        if "date" in df.columns:
+            df = df.assign(date=pd.to_datetime(df["date"], errors="coerce"))
+            df = df.sort_values([*(partition_cols or []), "date"], kind="stable")
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        elif os.path.exists(path) and partition_cols:
+            os.remove(path)
+        df.to_parquet(path, index=False, partition_cols=partition_cols)
+    elif suffix in FEATHER_SUFFIXES:
+        df.reset_index(drop=True).to_feather(path)
+    elif suffix in EXCEL_SUFFIXES:
+        df.to_excel(path, index=False)
+    else:
+        raise ValueError(f"Unsupported table format: {path}")
+
+
+def _apply_filters(df, filters):
+    """Applies pyarrow-style [(column, op, value), ...] filters to a loaded DataFrame."""
+    mask = pd.Series(True, index=df.index)
+    for column, op, value in filters or []:
+        values = df[column]
+        if isinstance(value, (datetime.date, pd.Timestamp)) and not (
+            pd.api.types.is_datetime64_any_dtype(values)
+        ):
+            values = pd.to_datetime(values, errors="coerce")
+        mask &= _OPERATORS[op](values, value)
+    return df[mask]
+
+
+def read_table(path, columns=None, filters=None):
+    """Reads a table written by write_table with optional column projection and filters.
+
+    filters use the pyarrow form [(column, op, value), ...] and are pushed
+    down to the Parquet reader, so partitions and row groups that cannot
+    match are skipped. If a Parquet path does not exist yet, the Excel file
+    with the same stem is read instead.
+    """
+    if not os.path.exists(path) and legacy_excel_path(path):
+        path = legacy_excel_path(path)
+    suffix = _suffix(path)
+    if suffix == ".parquet":
+        df = pd.read_parquet(path, columns=columns, filters=filters)
+        for column in df.select_dtypes("category").columns:
+            df[column] = df[column].astype(object)
+        return df
+    if suffix in FEATHER_SUFFIXES:
+        df = pd.read_feather(path)
+    elif suffix in EXCEL_SUFFIXES:
+        df = pd.read_excel(path, engine="openpyxl")
+    else:
+        raise ValueError(f"Unsupported table format: {path}")
+    df = _apply_filters(df, filters)
+    return df[columns] if columns is not None else df
+
+
+def convert_excel_files(root="data"):
+    """One-shot conversion of every Excel file under root to a sibling Parquet file.
+
+    'date' columns are parsed to timestamps; files holding several stocks are
+    partitioned by stock.
+    """
+    converted = []
+    for directory, _, files in os.walk(root):
+        for name in sorted(files):
+            if _suffix(name) not in EXCEL_SUFFIXES or name.startswith("~$"):
+                continue
+            source = os.path.join(directory, name)
+            target = os.path.splitext(source)[0] + DEFAULT_SUFFIX
+            df = pd.read_excel(source, engine="openpyxl")
+            if "date" in df.columns:
+                df["date"] = pd.to_datetime(df["date"], errors="coerce")
+            partition_cols = None
+            if "stock" in df.columns and df["stock"].nunique() > 1:
+                partition_cols = ["stock"]
+            write_table(df, target, partition_cols=partition_cols)
+            converted.append(target)
+            print(f"Converted {source} -> {target}")
+    return converted
+
+
+if __name__ == "__main__":
+    convert_excel_files(sys.argv[1] if len(sys.argv) > 1 else "data")
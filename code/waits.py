@@ -0,0 +1,164 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+import pandas as pd
+
+BUCKET_BOUNDS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+MESSAGE_COUNT_SCRIPT = (
+    "return document.querySelectorAll(\"time[class*='StreamMessage_timestamp']\").length;"
+)
+SCROLL_HEIGHT_SCRIPT = "return document.body.scrollHeight;"
+NETWORK_STATE_SCRIPT = (
+    "return [document.readyState, performance.getEntriesByType('resource').length];"
+)
+
+
+class LatencyHistogram:
+    """Thread-safe per-stage latency histogram with fixed buckets in seconds."""
+
+    def __init__(self, bounds=BUCKET_BOUNDS):
+        self.bounds = tuple(bounds)
+        self._lock = threading.Lock()
+        self._stages = {}
+
+    def record(self, stage, seconds):
+        with self._lock:
+            entry = self._stages.setdefault(
+                stage,
+                {"counts": [0] * (len(self.bounds) + 1), "total": 0.0, "max": 0.0},
+            )
+            entry["counts"][bisect.bisect_left(self.bounds, seconds)] += 1
+            entry["total"] += seconds
+            entry["max"] = max(entry["max"], seconds)
+
+    @contextmanager
+    def time(self, stage):
+        """Records the duration of the with-block under stage."""
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start_time)
+
+    def _quantile(self, counts, q):
+        """Returns the upper bucket bound below which a q fraction of samples fall."""
+        target = q * sum(counts)
+        seen = 0
+        for bound, count in zip(self.bounds + (float("inf"),), counts):
+            seen += count
+            if seen >= target:
+                return bound
+        return float("inf")
+
+    def summary(self):
+        """Returns one row per stage with count, total, mean, max and bucketed p50/p95."""
+        rows = []
+        with self._lock:
+            for stage, entry in sorted(self._stages.items()):
+                count = sum(entry["counts"])
+                rows.append(
+                    {
+                        "stage": stage,
+                        "count": count,
+                        "total_seconds": entry["total"],
+                        "mean_seconds": entry["total"] / count,
+                        "p50_le": self._quantile(entry["counts"], 0.5),
+                        "p95_le": self._quantile(entry["counts"], 0.95),
+                        "max_seconds": entry["max"],
+                    }
+                )
+        return pd.DataFrame(rows)
+
+    def reset(self):
+        with self._lock:
+            self._stages.clear()
+
+
+STAGE_LATENCY = LatencyHistogram()
+
+
+def wait_until(
+    condition,
+    timeout=10.0,
+    initial_interval=0.05,
+    max_interval=1.0,
+    backoff=1.5,
+    stage=None,
+    histogram=STAGE_LATENCY,
+):
+    """Polls condition until it returns a truthy value or timeout seconds pass.
+
+    The polling interval starts at initial_interval and grows by backoff up
+    to max_interval, so fast conditions return quickly without hammering the
+    driver on slow ones. Exceptions raised by condition count as not ready.
+    Returns the condition's value, or False on timeout. The wait is recorded
+    in histogram under stage when one is given.
+    """
+    start_time = time.perf_counter()
+    deadline = start_time + timeout
+    interval = initial_interval
+    result = False
+    while True:
+        try:
+            result = condition()
+        except Exception:
+            result = False
+        now = time.perf_counter()
+        if result or now >= deadline:
+            break
+        time.sleep(min(interval, deadline - now))
+        interval = min(interval * backoff, max_interval)
+    if stage and histogram is not None:
+        histogram.record(stage, time.perf_counter() - start_time)
+    return result
+
+
+def message_count(driver):
+    """Returns the number of stream messages currently in the DOM."""
+    return driver.execute_script(MESSAGE_COUNT_SCRIPT)
+
+
+def scroll_height(driver):
+    return driver.execute_script(SCROLL_HEIGHT_SCRIPT)
+
+
+def message_count_increased(driver, previous):
+    """Condition: more than previous stream messages are in the DOM."""
+    return lambda: message_count(driver) > previous
+
+
+def scroll_height_changed(driver, previous):
+    """Condition: the page has grown past the previous scroll height."""
+    return lambda: scroll_height(driver) != previous
+
+
+def scroll_height_stable(driver, quiet_period=0.5):
+    """Condition: the scroll height has not changed for quiet_period seconds."""
+    state = {"height": None, "since": None}
+
+    def condition():
+        height = scroll_height(driver)
+        now = time.perf_counter()
+        if height != state["height"]:
+            state["height"], state["since"] = height, now
+            return False
+        return now - state["since"] >= quiet_period
+
+    return condition
+
+
+def network_idle(driver, quiet_period=0.5):
+    """Condition: the document is loaded and no new resource has been fetched for quiet_period seconds."""
+    state = {"resources": None, "since": None}
+
+    def condition():
+        ready_state, resources = driver.execute_script(NETWORK_STATE_SCRIPT)
+        now = time.perf_counter()
+        if ready_state != "complete" or resources != state["resources"]:
+            state["resources"], state["since"] = resources, now
+            return False
+        return now - state["since"] >= quiet_period
+
+    return condition
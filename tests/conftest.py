@@ -0,0 +1,15 @@
+import os
+import sys
+
+import pytest
+
+# The scripts in code/ import each other as top-level modules.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "code"))
+from benchmark import make_session  # noqa: E402
+
+
+@pytest.fixture
+def session():
+    """A session on a fresh SQLite database, deleted after the test."""
+    with make_session() as session:
+        yield session
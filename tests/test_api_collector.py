@@ -0,0 +1,57 @@
+import json
+
+import pytest
+from datastorage import Comment
+from fixture_server import serve_api_fixture
+from stocktwit import get_comments_one_stock_api
+from stocktwits_api import make_http_session
+
+
+@pytest.fixture
+def api():
+    """A mock API with 40 messages in pages of 15 that rate-limits every third request."""
+    server, url = serve_api_fixture(total_messages=40, page_size=15, rate_limit_every=3)
+    yield server.RequestHandlerClass, url
+    server.shutdown()
+    server.server_close()
+
+
+def stored_rows(session, stock):
+    return session.query(Comment).filter(Comment.stock == stock).count()
+
+
+def read_cursor(tmp_path, stock):
+    with open(tmp_path / ".state" / f"{stock}.json", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_collects_every_page_through_rate_limits(api, tmp_path, session):
+    handler, url = api
+    http = make_http_session(backoff_factor=0)
+
+    saved = get_comments_one_stock_api(http, "AAPL", session, str(tmp_path), api_url=url)
+
+    assert saved == 40
+    assert stored_rows(session, "AAPL") == 40
+    # Three pages, the third refused once with a 429 and then retried.
+    assert handler.request_count == 4
+    cursor = read_cursor(tmp_path, "AAPL")
+    # Message N is posted N hours after 2024-10-01, so 24 to 40 share the newest date.
+    assert cursor["high_water"] == "2024-10-02"
+    assert len(cursor["boundary_keys"]) == 17
+
+
+def test_resumes_from_the_cursor(api, tmp_path, session):
+    handler, url = api
+    http = make_http_session(backoff_factor=0)
+    get_comments_one_stock_api(http, "AAPL", session, str(tmp_path), api_url=url)
+
+    handler.total_messages = 50
+    handler.request_count = 0
+    saved = get_comments_one_stock_api(http, "AAPL", session, str(tmp_path), api_url=url)
+
+    assert saved == 10
+    assert stored_rows(session, "AAPL") == 50
+    # The first page already reaches the previous run's messages.
+    assert handler.request_count == 1
+    assert read_cursor(tmp_path, "AAPL")["high_water"] == "2024-10-03"
@@ -0,0 +1,30 @@
+import pandas as pd
+import pytest
+from benchmark import make_comments
+from datastorage import Comment, save_to_database
+
+
+def test_resaved_comment_only_refreshes_influence(session):
+    comment = pd.DataFrame(
+        {
+            "stock": ["AAPL"],
+            "comment_time": ["2024-10-01"],
+            "comments": ["to the moon"],
+            "sentiment_tag": ["Bullish"],
+            "influence": [3],
+        }
+    )
+    assert save_to_database(comment, session) == 1
+    assert save_to_database(comment, session) == 0
+    assert save_to_database(comment.assign(influence=4), session) == 1
+    rows = session.query(Comment).all()
+    assert [row.influence for row in rows] == [4]
+
+
+def test_failed_write_leaves_session_usable(session):
+    comments = make_comments(5)
+    with pytest.raises(Exception):
+        save_to_database(comments.assign(comments=[object()] * 5), session)
+    # PostgreSQL refuses every later statement in a transaction that failed.
+    assert not session.in_transaction()
+    assert save_to_database(comments, session) == 5
@@ -0,0 +1,42 @@
+import pytest
+from stocktwit import label_influence, parse_count, scroll
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [("", 0), (" 7 ", 7), ("1,234", 1234), ("1.2K", 1200), ("3M", 3_000_000)],
+)
+def test_parse_count(text, expected):
+    assert parse_count(text) == expected
+
+
+def test_label_influence_needs_all_four_labels():
+    assert label_influence(["1", "", "2", "1.2K"]) == 1203
+    assert label_influence(["1", "2", "3"]) == 0
+
+
+def test_label_influence_ignores_unparsable_counts():
+    assert label_influence(["1", "2", "3", "n/a"]) == 0
+
+
+class LazyPage:
+    """A fake driver whose page loads three more messages per scroll step."""
+
+    def __init__(self):
+        self.messages = 20
+        self.calls = []
+
+    def execute_script(self, script):
+        if script.startswith("window.scrollBy"):
+            self.calls.append("scroll")
+            self.messages += 3
+            return None
+        self.calls.append("count")
+        return self.messages
+
+
+def test_scroll_waits_for_messages_after_every_step():
+    page = LazyPage()
+    scroll(page, fetch_interval=3, pause_time=1)
+    steps = "".join("s" if call == "scroll" else "c" for call in page.calls)
+    assert steps == "c" + "scc" * 3
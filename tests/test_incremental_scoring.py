@@ -0,0 +1,48 @@
+from benchmark import make_comments
+from datastorage import (
+    COMMENT_COLUMNS,
+    DailySentiment,
+    get_all_sentiments,
+    iter_comments,
+    save_to_database,
+)
+from inference import ERROR_RESULT
+from sentiment_analysis import sentiment_analysis
+
+
+def score(session, classify):
+    sentiment_analysis(
+        iter_comments(session, columns=["comment_id"] + COMMENT_COLUMNS, unscored=True),
+        incremental=True,
+        db_session=session,
+        classify=classify,
+    )
+
+
+def total_posts(session):
+    return sum(row.total_posts for row in session.query(DailySentiment))
+
+
+def test_failed_inference_is_retried_and_not_counted(session):
+    save_to_database(make_comments(40, n_stocks=3), session)
+
+    def fail_first_ten(texts):
+        return [ERROR_RESULT] * 10 + [{"label": "positive", "score": 0.9}] * (
+            len(texts) - 10
+        )
+
+    score(session, fail_first_ten)
+    assert total_posts(session) == 30
+
+    retried = []
+
+    def classify(texts):
+        retried.extend(texts)
+        return [{"label": "negative", "score": 0.8}] * len(texts)
+
+    score(session, classify)
+    assert len(retried) == 10
+    assert total_posts(session) == 40
+    sentiments = get_all_sentiments(session, columns=["sentiment"])
+    assert len(sentiments) == 40
+    assert (sentiments["sentiment"] != "error").all()
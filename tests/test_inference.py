@@ -0,0 +1,12 @@
+import pytest
+from inference import resolve_backend
+
+
+@pytest.mark.parametrize("device", [-1, 0])
+def test_auto_uses_the_fp32_model(device):
+    assert resolve_backend("auto", device) == ("torch", device)
+
+
+def test_optimized_backends_run_on_cpu():
+    assert resolve_backend("quantized", 0) == ("quantized", -1)
+    assert resolve_backend("onnx", 0) == ("onnx", -1)
@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+import pytest
+from model_selection import (
+    best_lags,
+    best_order,
+    select_arima_order,
+    select_differencing,
+)
+
+
+def noise(seed, n=300):
+    return pd.Series(np.random.default_rng(seed).standard_normal(n))
+
+
+def test_select_differencing_keeps_stationary_series():
+    d, pvalue = select_differencing(noise(0))
+    assert d == 0
+    assert pvalue < 0.05
+
+
+def test_select_differencing_differences_random_walk():
+    d, _ = select_differencing(noise(1).cumsum())
+    assert d == 1
+
+
+def test_select_arima_order_ranks_one_d():
+    table = select_arima_order(
+        noise(2).cumsum(),
+        p_values=range(2),
+        q_values=range(2),
+        n_workers=2,
+        cache_dir=None,
+    )
+    assert len(table) == 4
+    assert set(table["d"]) == {1}
+    assert table["adf_pvalue"].notna().all()
+
+
+def test_empty_selection_falls_back_to_the_default():
+    assert best_order(pd.DataFrame(), default=(0, 0, 2)) == (0, 0, 2)
+    assert best_lags(pd.DataFrame(), default=3) == 3
+    with pytest.raises(ValueError):
+        best_order(pd.DataFrame())
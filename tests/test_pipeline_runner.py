@@ -0,0 +1,32 @@
+import os
+
+import pandas as pd
+from pipeline_runner import Pipeline
+
+
+def double(frame):
+    return frame * 2
+
+
+def increment(frame):
+    return frame + 1
+
+
+def test_old_cached_outputs_are_pruned(tmp_path):
+    cache_dir = tmp_path / "cache"
+    pipeline = (
+        Pipeline(cache_dir=str(cache_dir))
+        .add("double", double, ["source"])
+        .add("double-plus", increment, ["double"], sink=str(tmp_path / "out.parquet"))
+    )
+    for value in (1, 2):
+        result = pipeline.run(
+            {"source": pd.DataFrame({"a": [value]})}, outputs=["double-plus"]
+        )
+    assert result["double-plus"]["a"].tolist() == [5]
+    cached = sorted(os.listdir(cache_dir))
+    assert [name.rsplit("-", 1)[0] for name in cached if name.endswith(".parquet")] == [
+        "double",
+        "double-plus",
+    ]
+    assert "sink_keys.json" in cached
@@ -0,0 +1,105 @@
+import shutil
+
+import pandas as pd
+import pytest
+from sqlalchemy.orm import sessionmaker
+from datastorage import Comment
+from fixture_server import serve_api_fixture, serve_fixtures
+from stocktwit import make_driver, scrape_all_stocks
+
+TICKERS = ["AAPL", "MSFT", "NKE"]
+
+
+@pytest.fixture
+def ticker_list(tmp_path):
+    path = tmp_path / "tickers.xlsx"
+    pd.DataFrame({"SYMBOL": TICKERS}).to_excel(path, index=False)
+    return str(path)
+
+
+@pytest.fixture
+def session_factory(session):
+    return sessionmaker(bind=session.get_bind())
+
+
+def rows_per_stock(session_factory):
+    with session_factory() as session:
+        rows = session.query(Comment.stock).all()
+    return pd.Series([row.stock for row in rows], dtype=object).value_counts().to_dict()
+
+
+@pytest.mark.parametrize("async_writes", [True, False])
+def test_api_pool_saves_every_ticker(ticker_list, session_factory, tmp_path, async_writes):
+    server, url = serve_api_fixture(total_messages=40, page_size=15, rate_limit_every=4)
+    try:
+        stats = scrape_all_stocks(
+            ticker_list,
+            "",
+            "",
+            session_factory,
+            n_workers=2,
+            csv_path=str(tmp_path / "comments"),
+            max_duration=30,
+            backend="api",
+            api_url=url,
+            async_writes=async_writes,
+        )
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert stats["tickers"].sum() == len(TICKERS)
+    assert stats["failures"].sum() == 0
+    assert stats["comments"].sum() == 40 * len(TICKERS)
+    assert rows_per_stock(session_factory) == {stock: 40 for stock in TICKERS}
+    for stock in TICKERS:
+        assert (tmp_path / "comments" / f"{stock}.csv").exists()
+
+
+def test_api_pool_requeues_failed_tickers(ticker_list, session_factory, tmp_path):
+    server, url = serve_api_fixture()
+    missing_url = url.replace("/streams/", "/missing/")
+    try:
+        stats = scrape_all_stocks(
+            ticker_list,
+            "",
+            "",
+            session_factory,
+            n_workers=2,
+            csv_path=str(tmp_path / "comments"),
+            max_duration=30,
+            max_attempts=2,
+            backend="api",
+            api_url=missing_url,
+        )
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert stats["tickers"].sum() == 0
+    assert stats["failures"].sum() == 2 * len(TICKERS)
+    assert rows_per_stock(session_factory) == {}
+
+
+@pytest.mark.skipif(
+    shutil.which("chromedriver") is None, reason="needs Chrome and chromedriver"
+)
+def test_browser_pool_saves_every_ticker(ticker_list, session_factory, tmp_path):
+    server, base_url = serve_fixtures()
+    try:
+        stats = scrape_all_stocks(
+            ticker_list,
+            "",
+            "",
+            session_factory,
+            n_workers=2,
+            base_url=base_url,
+            csv_path=str(tmp_path / "comments"),
+            max_duration=20,
+            driver_factory=make_driver,
+        )
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert stats["tickers"].sum() == len(TICKERS)
+    saved = rows_per_stock(session_factory)
+    assert set(saved) == set(TICKERS)
+    assert sum(saved.values()) == stats["comments"].sum()
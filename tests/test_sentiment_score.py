@@ -0,0 +1,30 @@
+import numpy as np
+import pandas as pd
+import pytest
+from benchmark import _reference_sentiment_score, make_sentiments
+from sentiment_analysis import compute_sentiment_score
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_compute_sentiment_score_matches_reference(seed):
+    """The chunked, vectorized scores match the original per-group loop on random inputs."""
+    rng = np.random.default_rng(seed)
+    data = make_sentiments(
+        n_rows=int(rng.integers(1, 5000)),
+        n_stocks=int(rng.integers(1, 20)),
+        n_days=int(rng.integers(1, 30)),
+        seed=int(rng.integers(0, 2**32)),
+        missing_influence=float(rng.random() * 0.2),
+    )
+    expected = _reference_sentiment_score(data)
+    bounds = np.sort(rng.integers(0, len(data), int(rng.integers(0, 4))))
+    edges = [0, *bounds, len(data)]
+    chunks = [data.iloc[a:b] for a, b in zip(edges[:-1], edges[1:])]
+    actual = compute_sentiment_score(chunks)
+    pd.testing.assert_frame_equal(
+        actual.reset_index(drop=True),
+        expected,
+        check_dtype=False,
+        rtol=1e-9,
+        atol=1e-12,
+    )